@@ -14,14 +14,72 @@ Created and written by Maksym Neyra-Nesterenko, with support and funding from th
 # MODULES AND IMPORTS #
 #######################
 
+import codecs
 import csv
 import os
 import re
-from xml.etree import ElementTree
+import signal
+from collections import deque
+from multiprocessing import current_process
+
+# use the libxml2 based lxml package to parse XML if it is installed
+try:
+    from lxml import etree as ElementTree
+    LXML_BACKEND = True
+except ImportError:
+    from xml.etree import ElementTree
+    LXML_BACKEND = False
+
+# xml.etree element, used to validate ElementPath expressions with either backend
+from xml.etree.ElementTree import Element as PyElement
 
 from opentabulate.main.config import SUPPORTED_ENCODINGS
 from opentabulate.main.thread_exception import ThreadInterruptError
 
+# size (in bytes) of the blocks decoded by the character encoding test
+ENCODING_CHECK_BLOCK_SIZE = 1 << 20
+
+# number of input rows handed to a tabulation worker at once
+TABULATE_BATCH_SIZE = 10000
+
+# number of batches allowed in flight per tabulation worker process
+TABULATE_BATCHES_PER_WORKER = 2
+
+# number of output rows accumulated before they are written
+WRITE_BATCH_SIZE = 4096
+
+# buffer size (in bytes) of tabulated output files
+WRITE_BUFFER_SIZE = 1 << 20
+
+# number of XML records read between checks of the interrupt event
+INTERRUPT_CHECK_INTERVAL = 1024
+
+# byte order mark (BOM) at the start of the input data
+BOM_REGEXP = re.compile('^\ufeff')
+
+# XML tag names (with an optional namespace) that are not ElementPath expressions
+XML_TAG_REGEXP = re.compile(r'(\{[^{}*]*\})?[^/\[\]()@!=:*{}\s]+\Z')
+
+##########################################
+# TABULATION WORKER PROCESS ENTRY POINTS #
+##########################################
+
+_worker_algorithm = None
+
+def _init_tabulate_worker(algorithm):
+    """
+    Tabulation worker process initializer, storing the (pickled) Algorithm object.
+    Interrupt signals are handled by the process that submits the batches, which
+    stops submitting them instead.
+    """
+    global _worker_algorithm
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_algorithm = algorithm
+
+def _process_batch(batch):
+    """Process a batch of input rows in a tabulation worker process."""
+    return _worker_algorithm._process_rows(batch)
+
 #####################################
 # DATA PROCESSING ALGORITHM CLASSES #
 #####################################
@@ -34,7 +92,10 @@ class Algorithm():
         source (Source): Dataset processing configuration and metadata.
         interrupt (threading.Event): Event to halt multi-threaded processing. 
         label_map (dict): Column name mapping to output CSV.
+        filter_map (list): Lookups and regular expressions for data filtering,
+            resolved before tabulation.
         FORCE_REGEXP (re.Pattern): Regular expression for 'force' values in source.
+        WORKERS (int): Number of worker processes used to process input rows.
 
         OUTPUT_ENC_ERRORS (str): Flag for how to handle character encoding errors.
         FILTER_FLAG (bool): Flag for data filtering.
@@ -55,6 +116,7 @@ class Algorithm():
         self.source = source
         self.interrupt = interrupt
         self.label_map = None
+        self.filter_map = None
 
         self.FORCE_REGEXP = re.compile('force:.*')
 
@@ -65,6 +127,7 @@ class Algorithm():
         self.ADD_INDEX = None
         self.NO_WHITESPACE = None
         self.LOWERCASE = None
+        self.WORKERS = None
 
         if source is not None:
             # flags from source file metadata
@@ -78,6 +141,7 @@ class Algorithm():
                 self.ADD_INDEX = True if source.config.getboolean('general', 'add_index') else False
                 self.NO_WHITESPACE = True if source.config.getboolean('general', 'clean_whitespace') else False
                 self.LOWERCASE = True if source.config.getboolean('general', 'lowercase_output') else False
+                self.WORKERS = source.config.getint('general', 'tabulate_workers')
 
             source.logger.debug("FILTER_FLAG set to %s" % self.FILTER_FLAG)
             source.logger.debug("PROVIDER_FLAG set to %s" % self.PROVIDER_FLAG)
@@ -85,6 +149,16 @@ class Algorithm():
             source.logger.debug("NO_WHITESPACE set to %s" % self.NO_WHITESPACE)
             source.logger.debug("LOWERCASE set to %s" % self.LOWERCASE)
             source.logger.debug("OUTPUT_ENC_ERRORS set to %s" % self.OUTPUT_ENC_ERRORS)
+            source.logger.debug("WORKERS set to %s" % self.WORKERS)
+
+    def __getstate__(self):
+        """
+        Pickle support for tabulation worker processes. The interrupt event cannot
+        be shared this way, it is checked by the main thread instead.
+        """
+        state = self.__dict__.copy()
+        state['interrupt'] = None
+        return state
 
     def char_encode_check(self):
         """
@@ -112,10 +186,14 @@ class Algorithm():
         else:
             for enc in SUPPORTED_ENCODINGS:
                 try:
-                    with open(self.source.input_path, encoding=enc) as f:
-                        for _ in f:
+                    # decode raw blocks rather than lines, nothing is kept
+                    decoder = codecs.getincrementaldecoder(enc)()
+                    with open(self.source.input_path, 'rb') as f:
+                        for block in iter(lambda: f.read(ENCODING_CHECK_BLOCK_SIZE), b''):
                             if self.interrupt is not None and self.interrupt.is_set():
                                 raise ThreadInterruptError("Interrupt event occurred.")
+                            decoder.decode(block)
+                        decoder.decode(b'', final=True)
                     return enc
                 except UnicodeDecodeError:
                     pass
@@ -131,17 +209,8 @@ class Algorithm():
         return [k for k in keys]
 
     def _isRowEmpty(self, row):
-        """
-        Check if a row (dict) has no non-empty entries.
-        
-        Raises:
-            AssertionError: Row value is not a string.
-        """
-        for key in row:
-            if row[key] != "":
-                assert isinstance(row[key], str), 'Row value is not a string'
-                return False
-        return True
+        """Check if a row (dict) has no non-empty entries."""
+        return not any(row.values())
 
     def _quickCleanEntry(self, entry):
         """Reformat a string using regex and return it."""
@@ -149,13 +218,9 @@ class Algorithm():
             entry = entry.decode()
 
         if self.NO_WHITESPACE: # remove redundant [:space:] char class characters
-            # since this includes removal of newlines, the next regexps are safe and
-            # do not require the "DOTALL" flag
-            entry = re.sub(r"\s+", " ", entry)
-            # remove spaces occuring at the beginning and end of an entry
-            entry = re.sub(r"^\s+([^\s].*)", r"\1", entry)
-            entry = re.sub(r"(.*[^\s])\s+$", r"\1", entry)
-            entry = re.sub(r"^\s+$", "", entry)
+            # splitting on whitespace also drops leading and trailing whitespace,
+            # this is equivalent to substituting r"\s+" by a space and stripping
+            entry = ' '.join(entry.split())
 
         if self.LOWERCASE: # make entries lowercase
             entry = entry.lower()
@@ -198,7 +263,8 @@ class CSV_Algorithm(Algorithm):
         with open(self.source.input_path, 'r', encoding=enc) as csv_file_read, \
              open(self.source.output_path, 'w',
                   encoding=self.source.config.get('general', 'target_encoding'),
-                  errors=self.OUTPUT_ENC_ERRORS
+                  errors=self.OUTPUT_ENC_ERRORS,
+                  buffering=WRITE_BUFFER_SIZE
              ) as csv_file_write:
             # define column labels
             fieldnames = self._generateFieldNames(tags)
@@ -210,84 +276,256 @@ class CSV_Algorithm(Algorithm):
                 fieldnames.insert(0, 'idx')
 
             # define reader/writer
-            csvreader = csv.DictReader(
+            csvreader = csv.reader(
                 csv_file_read,
                 delimiter=self.source.metadata['format']['delimiter'],
                 quotechar=self.source.metadata['format']['quote']
             )
-            csvwriter = csv.DictWriter(
+            csvwriter = csv.writer(
                 csv_file_write,
-                fieldnames,
                 delimiter=',',
                 quotechar='"',
                 quoting=csv.QUOTE_MINIMAL
             )
 
+            header = next(csvreader)
+
             # remove (possibly existing) byte order mark (BOM)
-            csvreader.fieldnames[0] = re.sub(r"^\ufeff(.+)", r"\1", csvreader.fieldnames[0])
-            no_columns = len(csvreader.fieldnames)
+            header[0] = BOM_REGEXP.sub('', header[0])
+            no_columns = len(header)
+
+            self._csv_construct_plan(header)
             
-            csvwriter.writeheader()
+            csvwriter.writerow(fieldnames)
 
             idx = 0
-            
-            for entity in csvreader:
+
+            for rows in self._pipeline(self._csv_batches(csvreader, no_columns)):
+                if self.ADD_INDEX:
+                    for row in rows:
+                        row[0] = idx
+                        idx += 1
+
+                csvwriter.writerows(rows)
+
+    def _csv_construct_plan(self, header):
+        """
+        Resolve the label map against the header of the input data, so that the rows
+        can be processed by position. The plan has a (kind, payload) entry for each
+        output column, in order, where kind is one of
+
+        - 'force' : payload is the (cleaned) forced value
+        - 'copy' : payload is the index of the input column
+        - 'join' : payload is a list of ('force', value) or ('copy', index) entries
+          to be joined by spaces
+
+        Args:
+            header (list): Input column names.
+
+        Raises:
+            KeyError: A column in the label map or filter is missing from the input.
+        """
+        # duplicate column names refer to the last occurrence (as csv.DictReader)
+        columns = {name : i for i, name in enumerate(header)}
+
+        def resolve(value):
+            if self._isForceValue(value):
+                return ('force', value.split(':', 1)[1])
+            else:
+                return ('copy', columns[value])
+
+        plan = []
+        for key in self.label_map:
+            value = self.label_map[key]
+            if isinstance(value, list):
+                plan.append(('join', [resolve(subentry) for subentry in value]))
+            else:
+                kind, payload = resolve(value)
+                if kind == 'force':
+                    payload = self._quickCleanEntry(payload)
+                plan.append((kind, payload))
+
+        self._csv_plan = plan
+        self._csv_transform = None
+
+        if self.FILTER_FLAG:
+            filters = self.source.metadata['filter']
+            self.filter_map = [(columns[attribute], filters[attribute]) for attribute in filters]
+
+    def _csv_batches(self, csvreader, no_columns):
+        """
+        Split the rows of a CSV reader into batches for the '_pipeline' method.
+
+        Raises:
+            csv.Error: Incorrect format of CSV data
+        """
+        batch = []
+
+        for entity in csvreader:
+            # if there are more or less row entries than number of columns, throw error
+            if len(entity) != no_columns:
+                if not entity: # skip blank lines (as csv.DictReader)
+                    continue
+                raise csv.Error("Incorrect number of entries on line %s" % csvreader.line_num)
+
+            batch.append(entity)
+
+            if len(batch) == TABULATE_BATCH_SIZE:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+    def _csv_compile_transform(self):
+        """
+        Generate and compile a function from the plan of '_csv_construct_plan' that
+        maps an input row to an output row. The plan is fixed for the whole input,
+        so its branches (and the cleaning options) are resolved once here instead
+        of for every row. For example, with the lowercase option, a plan with a
+        copied, a forced and a joined column compiles to
+
+            def transform(entity):
+                return [entity[3].lower(), _force0, ' '.join((entity[1], entity[7])).lower()]
+
+        Returns:
+            function: Function taking an input row (list) and returning a new row.
+        """
+        namespace = dict()
+
+        def clean(expression):
+            if self.NO_WHITESPACE:
+                expression = "' '.join(%s.split())" % expression
+            if self.LOWERCASE:
+                expression = "%s.lower()" % expression
+            return expression
+
+        def operand(kind, payload):
+            if kind == 'copy':
+                return 'entity[%d]' % payload
+            else:
+                # forced values are bound by name rather than written as literals
+                name = '_force%d' % len(namespace)
+                namespace[name] = payload
+                return name
+
+        entries = []
+        for kind, payload in self._csv_plan:
+            if kind == 'copy':
+                entries.append(clean(operand(kind, payload)))
+            elif kind == 'force':
+                entries.append(operand(kind, payload))
+            elif payload:
+                components = [operand(part_kind, part) for part_kind, part in payload]
+                entries.append(clean("' '.join((%s,))" % ', '.join(components)))
+            else: # an empty list joins to an empty string
+                entries.append("''")
+
+        code = "def transform(entity):\n    return [%s]\n" % ', '.join(entries)
+        exec(compile(code, '<csv transform>', 'exec'), namespace)
+
+        self._csv_transform = namespace['transform']
+        return self._csv_transform
+
+    def __getstate__(self):
+        """
+        Pickle support for tabulation worker processes. Compiled functions cannot
+        be pickled, the row transform is compiled again by each worker.
+        """
+        state = super().__getstate__()
+        state['_csv_transform'] = None
+        return state
+
+    def _pipeline(self, batches):
+        """
+        Process batches of input rows with the '_process_rows' method, yielding
+        the results in input order. If more than one worker is configured, the
+        batches are processed concurrently by a pool of worker processes, with a
+        bounded number of batches in flight.
+
+        Args:
+            batches (iterable): Iterable of lists of input rows.
+
+        Raises:
+            ThreadInterruptError: Interrupt event occurred in main thread.
+        """
+        if self.WORKERS is not None and self.WORKERS > 1:
+            # only imported if worker processes are used
+            from concurrent.futures import ProcessPoolExecutor
+
+        # daemonic (pool) processes may not have child processes in older versions
+        # of Python, in which case batches are processed serially as well
+        if self.WORKERS is None or self.WORKERS <= 1 or current_process().daemon:
+            for batch in batches:
                 if self.interrupt is not None and self.interrupt.is_set():
                     raise ThreadInterruptError("Interrupt event occurred")
+                yield self._process_rows(batch)
+            return
+
+        max_pending = self.WORKERS * TABULATE_BATCHES_PER_WORKER
+        pending = deque()
+
+        # the Algorithm object is sent once to each worker, not with every batch
+        with ProcessPoolExecutor(max_workers=self.WORKERS,
+                                 initializer=_init_tabulate_worker,
+                                 initargs=(self,)) as executor:
+            try:
+                for batch in batches:
+                    if self.interrupt is not None and self.interrupt.is_set():
+                        raise ThreadInterruptError("Interrupt event occurred")
+                    pending.append(executor.submit(_process_batch, batch))
+
+                    if len(pending) >= max_pending:
+                        yield pending.popleft().result()
+
+                while pending:
+                    if self.interrupt is not None and self.interrupt.is_set():
+                        raise ThreadInterruptError("Interrupt event occurred")
+                    yield pending.popleft().result()
+            finally:
+                # discard work that has not started if processing halts early
+                for future in pending:
+                    future.cancel()
+
+    def _process_rows(self, rows):
+        """
+        Filter, reformat and clean a batch of CSV rows using the plan built by
+        '_csv_construct_plan'.
 
-                row = dict()
+        Args:
+            rows (list): Input rows (list) read by a csv.reader.
 
-                no_row_entries = 0
-                for x in entity:
-                    if entity[x] is not None:
-                        no_row_entries += 1
+        Returns:
+            list: Non-empty output rows (list) to be written to the tabulated data.
+                If ADD_INDEX is set, the first entry is a placeholder for the index.
+        """
+        output = []
 
-                # if there are more or less row entries than number of columns, throw error
-                if no_row_entries != no_columns:
-                    raise csv.Error("Incorrect number of entries on line %s" % csvreader.line_num)
-                    
-                # filter entry
-                if not self._csv_keep_entry(entity):
-                    continue
-                    
-                for key in tags:
+        # local references for the row loop
+        transform = self._csv_transform or self._csv_compile_transform()
+        keep_entry = self._csv_keep_entry
+        provider_flag = self.PROVIDER_FLAG
+        provider = self.source.metadata['provider'] if provider_flag else None
+        add_index = self.ADD_INDEX
 
-                    # --%-- check if tags[key] is a JSON array --%--
-                    if isinstance(tags[key], list):
-                        components = []
-                        for subentry in tags[key]:
-                            # is 'i' a 'force' entry?
-                            if self._isForceValue(subentry):
-                                components.append(subentry.split(':')[1])
-                            else:
-                                components.append(entity[subentry])
+        for entity in rows:
+            # filter entry
+            if not keep_entry(entity):
+                continue
 
-                            entry = ' '.join(components)
-                            entry = self._quickCleanEntry(entry)
-                            
-                        row[key] = entry
-                        continue
-                            
-                    # --%-- all other cases handled here --%--
-                    # is 'tags[key]' a 'force' entry?
-                    if self._isForceValue(tags[key]):
-                        entry = tags[key].split(':')[1]
-                    else:
-                        entry = entity[tags[key]]
+            row = transform(entity)
 
-                    row[key] = self._quickCleanEntry(entry)
+            if any(row):
+                # add customized entries here (e.g. provider)
+                if provider_flag:
+                    row.append(provider)
 
-                if not self._isRowEmpty(row):
-                    # add customized entries here (e.g. provider)
-                    if self.PROVIDER_FLAG:
-                        row['provider'] = self.source.metadata['provider']
+                if add_index:
+                    row.insert(0, None)
 
-                    if self.ADD_INDEX:
-                        row['idx'] = idx
-                        idx += 1
-                        
-                    csvwriter.writerow(row)
-            
+                output.append(row)
+
+        return output
 
     def _csv_keep_entry(self, entity):
         """
@@ -297,17 +535,9 @@ class CSV_Algorithm(Algorithm):
             # keep entries if no filter flag is used
             return True
         else:
-            BOOL_MATCHES = []
-            for attribute in self.source.metadata['filter']:
-                match = False
-                regexp = self.source.metadata['filter'][attribute]
-                if regexp.search(entity[attribute]):
-                    match = True
-                BOOL_MATCHES.append(match)
-
-            for var in BOOL_MATCHES:
+            for index, regexp in self.filter_map:
                 # if one of the matches failed, discard entry
-                if not var:
+                if not regexp.search(entity[index]):
                     return False
             # otherwise, keep entry
             return True
@@ -321,21 +551,88 @@ class XML_Algorithm(Algorithm):
         """
         Constructs a dictionary from a column map that the 'tabulate' function uses to
         to reformat input data. In this case (XML formatted data), the values in the
-        column map must be converted to XPath expressions.
+        column map are converted to (kind, value) tuples. 'force' values are resolved
+        here (and cleaned, unless part of a list), other kinds are lookups created
+        by '_xml_lookup'.
         """
         label_map = dict()
-        # append existing data using XPath expressions (for parsing)
+        # append existing data using lookup tuples (for parsing)
         for k in self.source.column_map:
             if isinstance(self.source.column_map[k], list):
                 label_map[k] = list()
                 for t in self.source.column_map[k]:
-                    label_map[k].append(t if self._isForceValue(t) else (".//" + t))
+                    if self._isForceValue(t):
+                        label_map[k].append(('force', t.split(':', 1)[1]))
+                    else:
+                        label_map[k].append(self._xml_lookup(t))
             else:
                 val = self.source.column_map[k]
-                label_map[k] = val if self._isForceValue(val) else (".//" + val)
+                if self._isForceValue(val):
+                    label_map[k] = ('force', self._quickCleanEntry(val.split(':', 1)[1]))
+                else:
+                    label_map[k] = self._xml_lookup(val)
                     
         self.label_map = label_map
 
+        if self.FILTER_FLAG:
+            filters = self.source.metadata['filter']
+            self.filter_map = [
+                (attribute, self._xml_lookup(attribute), filters[attribute])
+                for attribute in filters
+            ]
+
+    def _xml_lookup(self, tag):
+        """
+        Create a lookup tuple for a tag of the column map. Plain tag names are
+        matched by iterating over the descendants of a header element, everything
+        else is evaluated as an ElementPath expression. With the lxml backend,
+        expressions that are also valid XPath are compiled once instead.
+
+        Args:
+            tag (str): Tag name or ElementPath expression.
+
+        Returns:
+            tuple: ('tag', tag), ('xpath', ElementTree.XPath) or ('path', './/' + tag).
+
+        Raises:
+            SyntaxError: Tag is not a valid ElementPath expression.
+        """
+        header = self.source.metadata['format']['header']
+        # Element.iter includes the element itself, which './/' excludes
+        if tag != header and tag not in ('.', '..') and XML_TAG_REGEXP.match(tag):
+            return ('tag', tag)
+
+        # expressions must be valid ElementPath with either backend, lxml would
+        # otherwise evaluate XPath only syntax (e.g. '..' steps, which leave the
+        # header element) that xml.etree rejects
+        path = './/' + tag
+        PyElement(header).find(path)
+
+        # namespace wildcards ('{*}tag', '{}tag') are specific to ElementPath
+        if LXML_BACKEND and '{' not in tag:
+            try:
+                return ('xpath', ElementTree.XPath('(.//%s)[1]' % tag))
+            except ElementTree.XPathSyntaxError:
+                pass # ElementPath specific syntax
+
+        return ('path', path)
+
+    def _xml_find(self, head_element, lookup):
+        """
+        Find the first descendant of a header element using a lookup tuple.
+
+        Returns:
+            ElementTree.Element: Matching element, None if there is no match.
+        """
+        kind, name = lookup
+        if kind == 'tag':
+            return next(head_element.iter(name), None)
+        elif kind == 'xpath':
+            matches = name(head_element)
+            return matches[0] if matches else None
+        else:
+            return head_element.find(name)
+
 
     def tabulate(self):
         """
@@ -354,13 +651,10 @@ class XML_Algorithm(Algorithm):
         header = self.source.metadata['format']['header']
         enc = self.char_encode_check()
 
-        xmlp = ElementTree.XMLParser(encoding=enc)
-        tree = ElementTree.parse(self.source.input_path, parser=xmlp)
-        root = tree.getroot()
-
         with open(self.source.output_path, 'w',
                   encoding=self.source.config.get('general', 'target_encoding'),
-                  errors=self.OUTPUT_ENC_ERRORS
+                  errors=self.OUTPUT_ENC_ERRORS,
+                  buffering=WRITE_BUFFER_SIZE
         ) as csvfile:
             # write the initial row which identifies each column
             fieldnames = self._generateFieldNames(tags)
@@ -371,71 +665,147 @@ class XML_Algorithm(Algorithm):
             if self.ADD_INDEX:
                 fieldnames.insert(0, 'idx')
    
-            csvwriter = csv.DictWriter(
+            csvwriter = csv.writer(
                 csvfile,
-                fieldnames,
                 delimiter=',',
                 quotechar='"',
                 quoting=csv.QUOTE_MINIMAL
             )
 
-            csvwriter.writeheader()
+            csvwriter.writerow(fieldnames)
 
             idx = 0
-
-            for head_element in root.iter(header):
-                if self.interrupt is not None and self.interrupt.is_set():
+            out_batch = []
+
+            # local references for the record loop
+            values = list(tags.values())
+            interrupt = self.interrupt
+            keep_entry = self._xml_keep_entry
+            find = self._xml_find
+            is_element_missing = self._xml_is_element_missing
+            clean = self._quickCleanEntry
+            provider_flag = self.PROVIDER_FLAG
+            provider = self.source.metadata['provider'] if provider_flag else None
+            add_index = self.ADD_INDEX
+
+            for count, head_element in enumerate(self._xml_iter_headers(header, enc)):
+                if interrupt is not None and count % INTERRUPT_CHECK_INTERVAL == 0 \
+                   and interrupt.is_set():
                     raise ThreadInterruptError("Interrupt event occurred")
 
-                row = dict()
-
                 # filter entry
-                if not self._xml_keep_entry(head_element):
+                if not keep_entry(head_element):
                     continue
+
+                # output rows are lists, in the order of the label map
+                row = []
                 
-                for key in tags:
-                    # --%-- check if tags[key] is a JSON array --%--
-                    if isinstance(tags[key], list):
+                for tag in values:
+                    # --%-- check if tag is a JSON array --%--
+                    if isinstance(tag, list):
                         components = []
-                        for val in tags[key]:
+                        for val in tag:
                             # is val a 'force' entry?
-                            if self._isForceValue(val):
-                                components.append(val.split(':')[1])
+                            if val[0] == 'force':
+                                components.append(val[1])
                             else:
-                                assert val[:3] == './/'
-                                tag_name = val[3:] # removes './/' prefix
-                                subelement = head_element.find(val)
-                                subelement = self._xml_is_element_missing(subelement, tag_name, head_element)
+                                subelement = find(head_element, val)
+                                subelement = is_element_missing(subelement, val[1], head_element)
                                 components.append(subelement)
 
                         entry = ' '.join(components)
-                        row[key] = self._quickCleanEntry(entry)
+                        row.append(clean(entry))
                         continue
 
                     # --%-- all other cases handled here --%--
-                    # is 'tags[key]' a 'force' entry?
-                    if self._isForceValue(tags[key]):
-                        entry = tags[key].split(':')[1]
+                    # is 'tag' a 'force' entry? (already cleaned)
+                    if tag[0] == 'force':
+                        row.append(tag[1])
                     else:
-                        assert tags[key][:3] == './/'
-                        tag_name = tags[key][3:] # removes './/' prefix
-                        element = head_element.find(tags[key])
-                        element = self._xml_is_element_missing(element, tag_name, head_element)
-                        entry = element
+                        element = find(head_element, tag)
+                        element = is_element_missing(element, tag[1], head_element)
+                        row.append(clean(element))
                         
-                    row[key] = self._quickCleanEntry(entry)
-                        
-                if not self._isRowEmpty(row):
+                if any(row):
                     # add customized entries here (e.g. provider)
-                    if self.PROVIDER_FLAG:
-                        row['provider'] = self.source.metadata['provider']
+                    if provider_flag:
+                        row.append(provider)
 
-                    if self.ADD_INDEX:
-                        row['idx'] = idx
+                    if add_index:
+                        row.insert(0, idx)
                         idx += 1
 
-                    csvwriter.writerow(row)
+                    out_batch.append(row)
+
+                    if len(out_batch) == WRITE_BATCH_SIZE:
+                        csvwriter.writerows(out_batch)
+                        out_batch = []
 
+            csvwriter.writerows(out_batch)
+
+
+    def _xml_iter_headers(self, header, enc):
+        """
+        Generator of the header elements of the input data, in document order. The
+        data is parsed incrementally. Once the outermost header element of a subtree
+        is complete, it and its nested header elements are yielded, after which the
+        subtree is detached from the tree so that memory use does not grow with the
+        size of the input.
+
+        The lxml parser is configured to discard comments and processing
+        instructions and to allow large text nodes, matching the behaviour of
+        xml.etree.
+
+        Args:
+            header (str): Tag name identifying a single data point.
+            enc (str): Python character encoding string.
+        """
+        events = ('start', 'end')
+
+        if LXML_BACKEND:
+            # lxml reports the header elements only, and tracks parents itself
+            context = ElementTree.iterparse(self.source.input_path, events=events, tag=header,
+                                            encoding=enc, remove_comments=True,
+                                            remove_pis=True, huge_tree=True)
+            open_headers = 0
+            for event, element in context:
+                if event == 'start':
+                    open_headers += 1
+                    continue
+
+                open_headers -= 1
+                if open_headers == 0:
+                    for head_element in element.iter(header):
+                        yield head_element
+
+                    # discard the processed subtree and preceding siblings
+                    element.clear()
+                    parent = element.getparent()
+                    while element.getprevious() is not None:
+                        del parent[0]
+        else:
+            context = ElementTree.iterparse(self.source.input_path, events=events,
+                                            parser=ElementTree.XMLParser(encoding=enc))
+            open_elements = []
+            open_headers = 0
+            for event, element in context:
+                if event == 'start':
+                    open_elements.append(element)
+                    if element.tag == header:
+                        open_headers += 1
+                    continue
+
+                open_elements.pop()
+
+                if element.tag == header:
+                    open_headers -= 1
+                    if open_headers == 0:
+                        for head_element in element.iter(header):
+                            yield head_element
+
+                # a completed subtree outside of a header element has been processed
+                if open_headers == 0 and open_elements:
+                    open_elements[-1].remove(element)
 
     def _xml_keep_entry(self, head_element):
         """
@@ -445,19 +815,11 @@ class XML_Algorithm(Algorithm):
             # keep entries if no filter flag is used
             return True
         else:
-            BOOL_MATCHES = []
-            for attribute in self.source.metadata['filter']:
-                match = False
-                regexp = self.source.metadata['filter'][attribute]
-                element = head_element.find(".//" + attribute)
+            for attribute, lookup, regexp in self.filter_map:
+                element = self._xml_find(head_element, lookup)
                 element = self._xml_is_element_missing(element, attribute, head_element)
-                if regexp.search(element):
-                    match = True
-                BOOL_MATCHES.append(match)
-
-            for var in BOOL_MATCHES:
                 # if one of the matches failed, discard entry
-                if not var:
+                if not regexp.search(element):
                     return False
             # otherwise, keep entry
             return True
@@ -14,6 +14,13 @@ from opentabulate.main.config import DEFAULT_PATHS as def_paths
 from opentabulate.main.config import SUPPORTED_ENCODINGS as supp_enc
 from opentabulate.main.config import ENCODING_ERRORS as enc_errs
 
+# format of log messages
+LOG_FORMAT = '[%(levelname)s] <%(name)s>: %(message)s'
+
+# leaf directories of the OpenTabulate root directory ('./data' is their parent,
+# so it is created and verified along with them)
+DATA_FOLDERS = ('./data/input', './data/output', './sources')
+
 def parse_arguments():
     """
     Define the command line argument structure and parse it.
@@ -42,7 +49,9 @@ def parse_arguments():
     runtime_args.add_argument('--ignore-cache', action='store_true',
                               help='ignore processing redundancy cache')
     runtime_args.add_argument('-t', '--threads', action='store', default=1, type=int, metavar='N',
-                              help='multithread data processing on N threads')
+                              help='process data on N worker processes')
+    runtime_args.add_argument('--fail-fast', action='store_true',
+                              help='stop processing after the first failed source')
     
     # configuration options
     config_args = cmd_args.add_argument_group('configuration arguments',
@@ -57,12 +66,49 @@ def parse_arguments():
                              help='clean whitespace in output')
     config_args.add_argument('--lowercase', action='store', default=None, type=str, metavar='BOOL',
                              help='convert output to lowercase')
+    config_args.add_argument('--tabulate-workers', action='store', default=None, type=int, metavar='N',
+                             help='tabulate CSV input with N worker processes')
     config_args.add_argument('-l', '--log-level', action='store', default=None, type=int, metavar='N',
                              help='specify data processing log verbosity')
     
     return cmd_args.parse_args()
 
 
+def realpaths(paths):
+    """
+    Equivalent to applying os.path.realpath to each path, but each directory is
+    only resolved once, so that many files in the same directory do not resolve
+    every component of their path again.
+
+    Args:
+        paths (list): File paths.
+
+    Returns:
+        list: Canonical paths, in the same order.
+    """
+    real_dirs = dict()
+    real_paths = list()
+
+    for path in paths:
+        # symbolic links are resolved before parent directory references, which
+        # would be removed by os.path.abspath
+        if os.pardir in path.split(os.sep):
+            real_paths.append(os.path.realpath(path))
+            continue
+
+        dirname, basename = os.path.split(os.path.abspath(path))
+        if dirname not in real_dirs:
+            real_dirs[dirname] = os.path.realpath(dirname)
+
+        real_path = os.path.join(real_dirs[dirname], basename)
+        if os.path.islink(real_path):
+            real_path = os.path.realpath(real_path)
+
+        real_paths.append(real_path)
+
+    return real_paths
+
+
 def validate_args_and_config(p_args, config, cache_mgrs):
     """
     Validate the configuration file and command line arguments, then perform
@@ -76,8 +122,6 @@ def validate_args_and_config(p_args, config, cache_mgrs):
         config (Configuration): OpenTabulate configuration.
         cache_mgrs (list): List of CacheManager objects.
     """
-    data_folders = ('./data', './data/input', './data/output', './sources')
-    
     if p_args.copy_config == True:
         if os.path.exists(def_paths['conf_file']):
             print("Configuration file already exists, not doing anything.", file=sys.stderr)
@@ -143,7 +187,7 @@ def validate_args_and_config(p_args, config, cache_mgrs):
             sys.exit(1)
         else:
             print("Populating OpenTabulate data directory...")
-            for directory in data_folders:
+            for directory in DATA_FOLDERS:
                 os.makedirs(directory)
             print("Finished creating directories at: %s" % os.getcwd())
             sys.exit(0)
@@ -156,8 +200,7 @@ def validate_args_and_config(p_args, config, cache_mgrs):
         sys.exit(0)
 
     # update SOURCE paths to absolute paths *BEFORE* changing current working directory
-    for i in range(len(p_args.SOURCE)):
-        p_args.SOURCE[i] = os.path.realpath(p_args.SOURCE[i])
+    p_args.SOURCE = realpaths(p_args.SOURCE)
         
     # check that OpenTabulate's root directory exists
     try:
@@ -168,7 +211,7 @@ def validate_args_and_config(p_args, config, cache_mgrs):
         sys.exit(1)
 
     # verify that the data directories are intact
-    for directory in data_folders:
+    for directory in DATA_FOLDERS:
         if not os.path.isdir(directory):
             print("Error: data directories are misconfigured.", file=sys.stderr)
             sys.exit(1)
@@ -227,15 +270,22 @@ def validate_args_and_config(p_args, config, cache_mgrs):
         except ValueError:
             print("Error: lowercase flag must be a boolean value.", file=sys.stderr)
             sys.exit(1)
+
+    if p_args.tabulate_workers is not None:
+        if p_args.tabulate_workers <= 0:
+            print("Error: number of tabulation workers must be > 0.", file=sys.stderr)
+            sys.exit(1)
+        else:
+            config['general']['tabulate_workers'] = str(p_args.tabulate_workers)
             
     if p_args.log_level is not None:
         if p_args.log_level in log_level_map:
-            logging.basicConfig(format='[%(levelname)s] <%(name)s>: %(message)s',
+            logging.basicConfig(format=LOG_FORMAT,
                                 level=log_level_map[p_args.log_level])
         else:
             print("Error: log level must be 0, 1, 2 or 3 (the lower, the more verbose).", 
                   file=sys.stderr)
             sys.exit(1)
     else:
-        logging.basicConfig(format='[%(levelname)s] <%(name)s>: %(message)s',
+        logging.basicConfig(format=LOG_FORMAT,
                             level=log_level_map[config.getint('general', 'log_level')])
@@ -15,27 +15,57 @@ import re
 import sys
 import os
 
+# use the (multithreaded) BLAKE3 hash function if the blake3 package is installed
+try:
+    from blake3 import blake3
+    BLAKE3_HASH = True
+except ImportError:
+    BLAKE3_HASH = False
+
+# prefix of BLAKE3 digests in the cache, SHA256 digests have none so that caches
+# written by either hash function are never mistaken for one another
+BLAKE3_PREFIX = 'blake3:'
+
+# size (in bytes) of the blocks read when hashing a file
+HASH_BUFFER_SIZE = 1 << 20
+
+def file_stamp(data_path):
+    """
+    Stamp of a file that is cached along with its digest.
+
+    Returns:
+        (tuple): size (in bytes) and modification time (in nanoseconds) of the file
+    """
+    stat = os.stat(data_path)
+    return (stat.st_size, stat.st_mtime_ns)
+
 class CacheManager():
     """
     Cache manager object that provides the functions to read and write to the data
     processing cache. The cache is a file with lines formatted as
 
-        FILENAME HASH
+        FILENAME HASH [SIZE MTIME]
 
     where the hashes are SHA256 digests in hexadecimal. The choice of using SHA256
-    was purely for convenience since 'hashlib' is a built-in Python module.
+    was purely for convenience since 'hashlib' is a built-in Python module. If the
+    blake3 package is installed, BLAKE3 digests (prefixed with BLAKE3_PREFIX) are
+    used instead. The optional size (in bytes) and modification time (in
+    nanoseconds) are those of the hashed file, which is not hashed again while they
+    are unchanged.
 
     Attributes:
         regex (re.Pattern): regular expression used to parse the lines of cache
-        cache (list): (sorted) list of '(filename, hash)' tuples
+        cache (dict): mapping of filenames to hashes, written to disk in sorted order
+        stamps (dict): mapping of filenames to (size, modification time) pairs
         cache_path (str): hard-coded cache file path
     """
     def __init__(self, cache_path):
         """
         Constructor defines the cache manager attributes.
         """
-        self.regex = re.compile('(.+) (.+)\n')
-        self.cache = list()
+        self.regex = re.compile(r'(.+?) (\S+)(?: (\d+) (\d+))?\n')
+        self.cache = dict()
+        self.stamps = dict()
         self.cache_path = cache_path
         
         if not os.path.exists(self.cache_path):
@@ -58,106 +88,106 @@ class CacheManager():
                 if match is None:
                     raise IOError("Could not read cache, line structure is malformed")
 
-                self.cache.append(match.groups())
-
-        self.cache.sort(key=lambda t : t[0])
+                filename, digest, size, mtime = match.groups()
+                self.cache[filename] = digest
+                if size is not None:
+                    self.stamps[filename] = (int(size), int(mtime))
 
     def write_cache(self):
         """
-        Commit cache changes by writing to disk.
+        Commit cache changes by writing to disk. The cache is written in full to a
+        temporary file, which then atomically replaces the cache file.
 
         Raises:
             IOError: failed to write cache to disk.
         """
-        os.rename(self.cache_path, self.cache_path + '.tmp')
-        
+        tmp_path = self.cache_path + '.tmp'
+        lines = list()
+        for filename in sorted(self.cache):
+            if filename in self.stamps:
+                lines.append('%s %s %d %d\n' % ((filename, self.cache[filename])
+                                                 + self.stamps[filename]))
+            else:
+                lines.append(filename + ' ' + self.cache[filename] + '\n')
+        contents = ''.join(lines)
+
         try:
-            with open(self.cache_path, 'w') as cache_file:
-                for filename, digest in self.cache:
-                    cache_file.write(filename + ' ' + digest + '\n')
+            with open(tmp_path, 'w') as cache_file:
+                cache_file.write(contents)
+                cache_file.flush()
+                os.fsync(cache_file.fileno())
+            os.replace(tmp_path, self.cache_path)
         except:
-            os.remove(self.cache_path)
-            os.rename(self.cache_path + '.tmp', self.cache_path)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             raise IOError("Could not write cache.")
 
-        os.remove(self.cache_path + '.tmp')
-
     def query(self, filename):
         """
-        Query a filename in the loaded cache. The query executes a binary search.
+        Query a filename in the loaded cache.
 
         Returns:
-            (tuple): A 3-tuple with all 'None' or the following data
-                0 - (int): cache index of data item
-                1 - (str): name of item at index
-                2 - (str): hash digest of item at index
-        """
-        a = 0                 # left endpoint index
-        b = len(self.cache)-1 # right endpoint index
-
-        while a <= b:
-            m = (a+b) // 2
-            if self.cache[m][0] < filename:
-                a = m+1
-            elif self.cache[m][0] > filename:
-                b = m-1
-            else:
-                return m, self.cache[m][0], self.cache[m][1]
+            (str): hash digest of the filename, or None if it is not in the cache
+        """
+        return self.cache.get(filename)
+
+    def hash_file(self, filename, data_path):
+        """
+        Hash data given by 'data_path', cached as 'filename'. If the size and
+        modification time of the data are those recorded in the cache, the cached
+        digest is returned without reading the data.
+
+        Returns:
+            (tuple): hash digest of data and its (size, modification time) stamp
+        """
+        stamp = file_stamp(data_path)
+
+        if filename in self.cache and self.stamps.get(filename) == stamp:
+            return self.cache[filename], stamp
 
-        return None, None, None
+        return self.compute_hash(data_path), stamp
 
     def compute_hash(self, data_path):
         """
-        Compute the SHA256 hash of input data given by 'data_path'.
+        Compute the SHA256 (or BLAKE3) hash of input data given by 'data_path'.
 
         Returns:
             (str): hash digest of data
         """
-        hashfunc = hashlib.sha256()
-        buffer_size = 4096
+        if BLAKE3_HASH:
+            hashfunc = blake3(max_threads=blake3.AUTO)
+        else:
+            hashfunc = hashlib.sha256()
         
-        with open(data_path, 'rb') as data:
+        # unbuffered, blocks are read directly by the file system
+        with open(data_path, 'rb', buffering=0) as data:
             while True:
-                chunk = data.read(buffer_size)
+                chunk = data.read(HASH_BUFFER_SIZE)
                 
                 if not chunk:
                     break
                 
                 hashfunc.update(chunk)
 
+        if BLAKE3_HASH:
+            return BLAKE3_PREFIX + hashfunc.hexdigest()
         return hashfunc.hexdigest()
 
-    def insert(self, filename, digest):
+    def insert(self, filename, digest, stamp=None):
         """
-        Insert a filename and hash digest pair into the cache. The ordering by
-        filename is preserved and an existing filename will have its digest
-        replaced by the input digest.
+        Insert a filename and hash digest pair into the cache, along with the
+        (size, modification time) stamp of the hashed file if given. An existing
+        filename will have its digest and stamp replaced.
         """
-        a = 0
-        b = len(self.cache) - 1
-
-        ins_idx = int() # insertion index
-        found_idx = bool()
-
-        while a <= b:
-            m = (a+b) // 2
-            if self.cache[m][0] < filename:
-                a = m+1
-                ins_idx = m+1
-            elif self.cache[m][0] > filename:
-                b = m-1
-                ins_idx = m
-            else:
-                self.cache[m] = (filename, digest)
-                found_idx = True
-                break
-
-        if not found_idx:
-            self.cache.insert(ins_idx, (filename, digest))
- 
+        self.cache[filename] = digest
+        if stamp is not None:
+            self.stamps[filename] = stamp
+        else:
+            self.stamps.pop(filename, None)
 
     def flush(self):
         """
         Clear the loaded cache.
         """
-        self.cache.clear()
\ No newline at end of file
+        self.cache.clear()
+        self.stamps.clear()
\ No newline at end of file
@@ -13,6 +13,7 @@ Created and written by Maksym Neyra-Nesterenko, with support and funding from th
 *Center for Special Business Projects* (CSBP) at *Statistics Canada*.
 """
 import os
+import re
 import sys
 from configparser import ConfigParser
 from ast import literal_eval
@@ -23,6 +24,63 @@ DEFAULT_PATHS = {'conf_dir' : os.path.expanduser('~') + '/.config',
 SUPPORTED_ENCODINGS = ('utf-8', 'cp1252')
 ENCODING_ERRORS = ('strict', 'replace', 'ignore')
 
+# valid sections of the configuration file and options of the 'general' section
+BASE_SECTIONS = frozenset(('general', 'labels'))
+GENERAL_OPTIONS = frozenset(('root_directory', 'add_index', 'target_encoding',
+                             'output_encoding_errors', 'clean_whitespace',
+                             'lowercase_output', 'log_level', 'tabulate_workers'))
+
+# 'general' options with boolean values
+BOOLEAN_OPTIONS = ('add_index', 'clean_whitespace', 'lowercase_output')
+
+# output column names reserved by OpenTabulate
+RESERVED_COLUMNS = frozenset(('idx', 'provider'))
+
+# default settings for options missing from the 'general' section
+DEFAULT_SETTINGS = {'target_encoding' : 'utf-8',
+                    'output_encoding_errors' : 'strict',
+                    'add_index' : 'false',
+                    'clean_whitespace' : 'false',
+                    'lowercase_output' : 'false',
+                    'log_level' : '3',
+                    'tabulate_workers' : '1'}
+
+# label values of the common form ('column 1', 'column 2', ...), with plain string
+# literals (no escapes), are parsed without literal_eval
+_LABEL_STRING = r"""(?:'[^'\\\n\r\0]*'|"[^"\\\n\r\0]*")"""
+LABEL_REGEXP = re.compile(r'\(\s*(?:%s\s*,\s*)+(?:%s\s*)?\)' % (_LABEL_STRING, _LABEL_STRING))
+LABEL_STRING_REGEXP = re.compile(r"'([^']*)'" + r'|"([^"]*)"')
+
+# parsed label values, keyed by their string in the configuration file
+_LABEL_CACHE = dict()
+
+def parse_label(value):
+    """
+    Parse the value of a label in the configuration file, equivalent to (and cached
+    results of) ast.literal_eval.
+
+    Args:
+        value (str): Label value, normally a tuple of strings.
+
+    Returns:
+        Python literal represented by the value.
+
+    Raises:
+        ValueError, SyntaxError: Value is not a Python literal.
+    """
+    try:
+        return _LABEL_CACHE[value]
+    except KeyError:
+        pass
+
+    if LABEL_REGEXP.fullmatch(value):
+        label = tuple(single or double for single, double in LABEL_STRING_REGEXP.findall(value))
+    else:
+        label = literal_eval(value)
+
+    _LABEL_CACHE[value] = label
+    return label
+
 class ConfigError(Exception):
     """
     Configuration exception class. Primarily to be used for configuration file
@@ -64,7 +122,7 @@ class Configuration(ConfigParser):
                 self.read(self.conf_path)
             except:
                 raise
-        
+
     def validate(self):
         """
         Validates the contents of the configuration file.
@@ -76,14 +134,6 @@ class Configuration(ConfigParser):
         Raises:
             ConfigError: Validation error of loaded configuration
         """
-        base_sections = ('general', 'labels')
-    
-        general_section = ('root_directory', 'add_index', 'target_encoding',
-                           'output_encoding_errors', 'clean_whitespace', 'lowercase_output',
-                           'log_level')
-
-        reserved_cols = ('idx', 'provider')
-        
         # check that the mandatory section 'general' and option 'root_directory' are present
         # in the configuration file
         try:
@@ -98,55 +148,54 @@ class Configuration(ConfigParser):
 
         # check if configuration sections are valid
         for sec in self.sections():
-            if sec not in base_sections:
+            if sec not in BASE_SECTIONS:
                 raise ConfigError("'%s' is not a valid section" % sec)
 
         # check if 'general' section has invalid options
         for option in self['general']:
-            if option not in general_section:
+            if option not in GENERAL_OPTIONS:
                 raise ConfigError("'%s' is not a valid option in 'general' section" % option)
 
         # check if 'labels' section is using core labels
         for option in self['labels']:
-            if option in general_section:
+            if option in GENERAL_OPTIONS:
                 raise ConfigError("Cannot define label '%s', is a reserved word" % option)
 
         # add default settings then validate
-        defaults = {'target_encoding' : 'utf-8',
-                    'output_encoding_errors' : 'strict',
-                    'add_index' : 'false',
-                    'clean_whitespace' : 'false',
-                    'lowercase_output' : 'false',
-                    'log_level' : '3'}
+        self._add_defaults()
 
-        for def_opt in defaults:
-            if def_opt not in self['general']:
-                self.set('general', def_opt, defaults[def_opt])
+        # (interpolated) values of the 'general' section, read in one pass
+        general = dict(self.items('general'))
 
-        # validate boolean options
-        boolean_options = ('add_index', 'clean_whitespace', 'lowercase_output')
-        for option in boolean_options:
-            try:
-                self.getboolean('general', option)
-            except ValueError:
+        # validate boolean options (as ConfigParser.getboolean)
+        for option in BOOLEAN_OPTIONS:
+            if general[option].lower() not in self.BOOLEAN_STATES:
                 raise ConfigError("Option '%s' in 'general' section is not a"
                                   " boolean value" % option)
 
         # validate verbosity level
         try:
-            log_level = self.getint('general', 'log_level')
+            log_level = int(general['log_level'])
             assert log_level >= 0 and log_level <= 3
         except:
-            raise ConfigError("Option '%s' in 'general' is not an integer value"
-                              " between 0 and 3 (inclusive)" % option)
+            raise ConfigError("Option 'log_level' in 'general' is not an integer value"
+                              " between 0 and 3 (inclusive)")
+
+        # validate number of tabulation worker processes
+        try:
+            tabulate_workers = int(general['tabulate_workers'])
+            assert tabulate_workers > 0
+        except:
+            raise ConfigError("Option 'tabulate_workers' in 'general' is not a positive"
+                              " integer value")
 
         # validate encoding
-        encoding = self.get('general', 'target_encoding')
+        encoding = general['target_encoding']
         if encoding not in SUPPORTED_ENCODINGS:
             raise ConfigError("'%s' is not a supported output encoding" % encoding)
 
         # validate output encoding error handling
-        handler = self.get('general', 'output_encoding_errors')
+        handler = general['output_encoding_errors']
         if handler not in ENCODING_ERRORS:
             raise ConfigError("'%s' is not an output encoding error handler" % handler) 
 
@@ -156,12 +205,19 @@ class Configuration(ConfigParser):
             value = None
 
             try:
-                value = literal_eval(self.get('labels', option))
+                value = parse_label(self.get('labels', option))
                 assert isinstance(value, tuple)
             except:
                 raise ConfigError("Value of label '%s' is not a tuple" % option)
 
             for col in value:
-                if col in reserved_cols:
+                if col in RESERVED_COLUMNS:
                     raise ConfigError("Column name '%s' cannot be used, is a reserved"
                                       " word" % col)
+
+    def _add_defaults(self):
+        """Add default settings for options missing from the 'general' section."""
+        general = self['general']
+        for def_opt in DEFAULT_SETTINGS:
+            if def_opt not in general:
+                self.set('general', def_opt, DEFAULT_SETTINGS[def_opt])
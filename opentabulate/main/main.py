@@ -6,7 +6,6 @@ point for setuptools.
 Created and written by Maksym Neyra-Nesterenko, with support and funding from the
 Center for Special Business Projects (CSBP) at Statistics Canada.
 """
-import logging
 import os
 import signal
 import sys
@@ -14,9 +13,37 @@ import time
 
 from opentabulate.main.args import parse_arguments, validate_args_and_config
 from opentabulate.main.config import Configuration
-from opentabulate.main.cache import CacheManager
-from opentabulate.main.main_funcs import parse_source_file
-from opentabulate.main.thread import ThreadPool
+from opentabulate.main.cache import CacheManager, file_stamp
+
+def _compute_digests(sources, src_cache_mgr, input_cache_mgr, num_threads):
+    """
+    Hash the source files and input data of sources concurrently (hashlib releases
+    the GIL while hashing). Files that are unchanged since they were cached, by size
+    and modification time, are not read again.
+
+    Args:
+        sources (list): Source objects to hash.
+        src_cache_mgr (CacheManager): Source file cache manager.
+        input_cache_mgr (CacheManager): Input data cache manager.
+        num_threads (int): Number of threads to use.
+
+    Returns:
+        list: Pairs of (digest, stamp) tuples (see CacheManager.hash_file) of the
+            source file and input data, in order of 'sources'.
+    """
+    if not sources:
+        return []
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        src_digests = executor.map(src_cache_mgr.hash_file,
+                                   [source.src_path for source in sources],
+                                   [source.src_path for source in sources])
+        input_digests = executor.map(input_cache_mgr.hash_file,
+                                     [source.localfile for source in sources],
+                                     [source.input_path for source in sources])
+        return list(zip(src_digests, input_digests))
 
 def main():
     config = Configuration()
@@ -26,6 +53,11 @@ def main():
     
     validate_args_and_config(parsed_args, config, [input_cache_mgr, src_cache_mgr])
 
+    # the data processing modules (and their dependencies) are only imported if
+    # the arguments above did not end the program (e.g. --initialize)
+    from opentabulate.main.main_funcs import parse_source_file
+    from opentabulate.main.thread import ThreadPool
+
     # parse source files
     source_list = parse_source_file(parsed_args, config)
 
@@ -43,32 +75,42 @@ def main():
         print(io_err, file=sys.stderr)
         sys.exit(1)
 
+    # digests are only needed to decide whether sources with existing output are
+    # processed, other sources are hashed once they are processed successfully
+    if parsed_args.ignore_cache == False:
+        checked = [idx for idx, source in enumerate(source_list)
+                   if os.path.exists(source.output_path)]
+    else:
+        checked = []
+
+    digests = dict(zip(checked, _compute_digests([source_list[idx] for idx in checked],
+                                                 src_cache_mgr, input_cache_mgr,
+                                                 parsed_args.threads)))
+
     proc_sources = []
-    src_digests = []
-    data_digests = []
-
-    for source in source_list:
-        source_log = logging.getLogger(source.localfile)
-
-        current_input_digest = input_cache_mgr.compute_hash(source.input_path)
-        current_src_digest = src_cache_mgr.compute_hash(source.src_path)
-        
-        source_log.debug("Computed source file digest: %s" % current_src_digest)
-        source_log.debug("Computed input data digest: %s" % current_input_digest)
-       
-        if parsed_args.ignore_cache == False:
-            s_idx, _, cached_src_digest = src_cache_mgr.query(source.src_path)
-            d_idx, _, cached_input_digest = input_cache_mgr.query(source.localfile)
+    proc_digests = []
+
+    for idx, source in enumerate(source_list):
+        source_log = source.logger
+
+        if parsed_args.ignore_cache == True:
+            source_log.debug("Processing, ignoring cache")
+            add_to_proc = True
+        elif idx not in digests: # output is missing
+            source_log.debug("Output data is missing, proceeding anyway")
+            add_to_proc = True
+        else:
+            (current_src_digest, _), (current_input_digest, _) = digests[idx]
+            source_log.debug("Computed source file digest: %s" % current_src_digest)
+            source_log.debug("Computed input data digest: %s" % current_input_digest)
+
+            cached_src_digest = src_cache_mgr.query(source.src_path)
+            cached_input_digest = input_cache_mgr.query(source.localfile)
 
             source_log.debug("Cached source file digest: %s" % cached_src_digest)
             source_log.debug("Cached input data digest: %s" % cached_input_digest)
 
-            add_to_proc = False
-
-            if not os.path.exists(source.output_path): # output is missing
-                source_log.debug("Output data is missing, proceeding anyway")
-                add_to_proc = True
-            elif (s_idx is None) or (d_idx is None): # hashes are not in cache
+            if (cached_src_digest is None) or (cached_input_digest is None): # hashes are not in cache
                 source_log.debug("Processing due to absense of cached digest")
                 add_to_proc = True
             elif (cached_src_digest != current_src_digest) or \
@@ -79,31 +121,57 @@ def main():
                 source_log.debug("Both pairs of hash digests are equal, processing omitted")
                 add_to_proc = False
 
-            if add_to_proc:
-                proc_sources.append(source)
-                src_digests.append(current_src_digest)
-                data_digests.append(current_input_digest)
-        
-        else:
-            source_log.debug("Processing, ignoring cache")
+        if add_to_proc:
             proc_sources.append(source)
-            src_digests.append(current_src_digest)
-            data_digests.append(current_input_digest)
+            proc_digests.append(digests.get(idx))
+
+    # with several sources processed at a time, each by its own pool of tabulation
+    # workers, the number of tabulation workers is capped so that the total number
+    # of worker processes does not exceed the number of CPUs
+    num_workers = min(parsed_args.threads, len(proc_sources))
+    if num_workers > 1:
+        max_tabulate_workers = max(1, (os.cpu_count() or 1) // num_workers)
+        if config.getint('general', 'tabulate_workers') > max_tabulate_workers:
+            config['general']['tabulate_workers'] = str(max_tabulate_workers)
+
+    # stamps of the files of sources that are hashed after processing, their digests
+    # are only cached if the files did not change while they were processed
+    proc_stamps = dict()
+    for i, source in enumerate(proc_sources):
+        if proc_digests[i] is None:
+            try:
+                proc_stamps[i] = (file_stamp(source.src_path), file_stamp(source.input_path))
+            except OSError:
+                proc_stamps[i] = None
 
-    
     start_time = time.perf_counter()
     
-    with ThreadPool(proc_sources, num_threads=parsed_args.threads) as pool: # need num_threads to be command line args
+    with ThreadPool(proc_sources, num_threads=parsed_args.threads,
+                    fail_fast=parsed_args.fail_fast) as pool: # need num_threads to be command line args
         pool.execute_threads()
         proc_results = pool.get_rcodes()
 
     end_time = time.perf_counter()
 
-    
-    for i in range(len(proc_sources)):
-        if proc_results[i] == 0: # update cache if processing is successful
-            src_cache_mgr.insert(proc_sources[i].src_path, src_digests[i])
-            input_cache_mgr.insert(proc_sources[i].localfile, data_digests[i])
+    # update cache for sources that were processed successfully, hashing those
+    # that were not hashed beforehand
+    succeeded = [i for i in range(len(proc_sources)) if proc_results[i] == 0]
+    unhashed = [i for i in succeeded if proc_digests[i] is None]
+
+    for i, digest_pair in zip(unhashed, _compute_digests([proc_sources[i] for i in unhashed],
+                                                         src_cache_mgr, input_cache_mgr,
+                                                         parsed_args.threads)):
+        (_, src_stamp), (_, input_stamp) = digest_pair
+        if proc_stamps[i] == (src_stamp, input_stamp):
+            proc_digests[i] = digest_pair
+        else: # a file changed during processing, its digest is not of the processed file
+            proc_sources[i].logger.debug("Files changed during processing, digests not cached")
+
+    for i in succeeded:
+        if proc_digests[i] is None:
+            continue
+        src_cache_mgr.insert(proc_sources[i].src_path, *proc_digests[i][0])
+        input_cache_mgr.insert(proc_sources[i].localfile, *proc_digests[i][1])
 
     try:
         src_cache_mgr.write_cache()
@@ -114,32 +182,26 @@ def main():
 
     print("Completed processing in", end_time - start_time, "seconds.")
 
-    # display detected errors
-    errors_detected = False
-    incomplete_detected = False
-    
-    for val in proc_results:
-        if val != 0:
-            errors_detected = True
-            break
-
-    for val in proc_results:
-        if val is None:
-            incomplete_detected = True
-            break
-    
-    if errors_detected:
+    # display detected errors, collected in a single pass
+    failed = list()
+    incomplete = list()
+
+    for source, rcode in zip(proc_sources, proc_results):
+        if rcode == 1:
+            failed.append(source.localfile)
+        elif rcode is None:
+            incomplete.append(source.localfile)
+
+    if failed or incomplete:
         print("Error occurred during processing of:", file=sys.stderr) 
-        for i in range(len(proc_sources)):
-            if proc_results[i] == 1:
-                print("  *!*", proc_sources[i].localfile, file=sys.stderr)
+        for localfile in failed:
+            print("  *!*", localfile, file=sys.stderr)
         print("Please refer to the [ERROR] log messages during output.", file=sys.stderr)
 
-    if incomplete_detected:
+    if incomplete:
         print("Sources listed below never processed or finished due to interrupt:", file=sys.stderr)
-        for i in range(len(proc_sources)):
-            if proc_results[i] is None:
-                print(" *x*", proc_sources[i].localfile, file=sys.stderr)
+        for localfile in incomplete:
+            print(" *x*", localfile, file=sys.stderr)
     
 if __name__ == '__main__':
     main()
@@ -70,11 +70,15 @@ def process(source, interrupt):
         None: an interrupt occurred during a call to prepareData.
     """
     pipeline = tabulate.DataProcess(source)
-    source_log = logging.getLogger(source.localfile)
+    source_log = source.logger
+    log_debug = source_log.debug
+    # debug messages are only formatted if they are logged
+    debug_enabled = source_log.isEnabledFor(logging.DEBUG)
 
-    source_log.debug("Tabulating '%s'" % pipeline.source.localfile)
+    if debug_enabled:
+        log_debug("Tabulating '%s'" % source.localfile)
 
-    source_log.debug("Configuring algorithm objects ( pipeline.prepareData() )")
+    log_debug("Configuring algorithm objects ( pipeline.prepareData() )")
     try:
         pipeline.prepareData(interrupt)
     except ThreadInterruptError:
@@ -83,15 +87,16 @@ def process(source, interrupt):
         # queue to process at assigned return code 'None')
         return None 
 
-    source_log.debug("Configuring output column names ( pipeline.extractLabels() )")
-    pipeline.constructLabelMap()
-    
-    source_log.debug("Tabulating data ( pipeline.tabulate() )")
     try:
+        log_debug("Configuring output column names ( pipeline.extractLabels() )")
+        pipeline.constructLabelMap()
+
+        log_debug("Tabulating data ( pipeline.tabulate() )")
         pipeline.tabulate()
     except Exception as e: # general exceptions are handled here
         source_log.error("%s exception: %s." % (type(e).__name__, e))
         return 1
 
-    source_log.debug("Completed tabulation of '%s'" % pipeline.source.localfile)
+    if debug_enabled:
+        log_debug("Completed tabulation of '%s'" % source.localfile)
     return 0
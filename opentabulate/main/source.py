@@ -12,12 +12,52 @@ Note: the Source object is not meant to be modified by external functions or cla
 Created and written by Maksym Neyra-Nesterenko, with support and funding from the
 *Center for Special Business Projects* (CSBP) at *Statistics Canada*.
 """
+import functools
 import json
 import logging
 import os
 import re
 import sys
-from ast import literal_eval
+
+# use the faster orjson package to read source files if it is installed
+try:
+    import orjson
+    ORJSON_BACKEND = True
+except ImportError:
+    ORJSON_BACKEND = False
+
+from opentabulate.main.config import parse_label
+
+# tags required in every source file with their types (and type names in error
+# messages), checked in this order before 'schema_groups'
+REQUIRED_TAGS = (('localfile', str, 'a string'),
+                 ('format', dict, 'an object'),
+                 ('schema', dict, 'an object'))
+
+# placeholder for missing tags, which is never a JSON value
+_MISSING = object()
+
+# valid keys of the root and 'format' objects of a source file
+ROOT_LAYER = frozenset({'localfile', 'format', 'schema_groups', 'encoding', 'schema',
+                        'filter', 'provider', 'licence', 'source'})
+FORMAT_LAYER = frozenset({'type', 'header', 'quote', 'delimiter'})
+
+# default directories of input and output data
+INPUT_DIR = './data/input'
+OUTPUT_DIR = './data/output'
+
+# valid file extensions of 'localfile'
+EXTENSIONS = frozenset({'.csv', '.xml'})
+
+@functools.lru_cache(maxsize=512)
+def _compile_filter(pattern):
+    """Compile a filter regex, sources that share a filter share its pattern object."""
+    return re.compile(pattern)
+
+def _is_leaf(node):
+    """Check if a schema node is a string or a list of strings (a leaf of the schema)."""
+    return isinstance(node, str) or \
+        (isinstance(node, list) and all(type(item) is str for item in node))
 
 class Source(object):
     """
@@ -43,6 +83,9 @@ class Source(object):
 
         logger (Logger): Logger with self.localfile as its name.
     """
+    __slots__ = ('src_path', 'metadata', 'p_args', 'config', 'default_paths',
+                 'localfile', 'input_path', 'output_path', 'column_map', 'logger')
+
     def __init__(self, path, p_args=None, config=None, default_paths=True):
         """
         Initializes a new source file object.
@@ -59,11 +102,20 @@ class Source(object):
         if not os.path.exists(path):
             raise OSError('Path "%s" does not exist.' % path)
         self.src_path = path
-        try:
-            with open(path) as f:
-                self.metadata = json.load(f)
-        except:
-            raise # either raises JSONDecodeError or a file reading exception
+        # the file is read in one call and parsed from bytes (as UTF-8, UTF-16 or
+        # UTF-32), raises JSONDecodeError or a file reading exception
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        if ORJSON_BACKEND:
+            try:
+                self.metadata = orjson.loads(data)
+            except orjson.JSONDecodeError:
+                # input that only the json module accepts (e.g. UTF-16/32 encoded
+                # files, NaN or integers over 64 bits) is parsed by it instead
+                self.metadata = json.loads(data)
+        else:
+            self.metadata = json.loads(data)
 
         self.p_args = p_args
         self.config = config
@@ -105,29 +157,27 @@ class Source(object):
             ValueError: Incorrect entry (key or value) or combination or entries.
         """
         src_basename = os.path.basename(self.src_path)
+        metadata = self.metadata
 
         #####################
         # REQUIRED METADATA #
         #####################
 
-        # first set of required tags
-        required_tags = ('localfile', 'format', 'schema', 'schema_groups')
-        for tag in required_tags:
-            if tag not in self.metadata:
+        # required tags and their types
+        for tag, tag_type, type_name in REQUIRED_TAGS:
+            value = metadata.get(tag, _MISSING)
+            if value is _MISSING:
                 raise LookupError("%s '%s' tag is missing." % (src_basename, tag))
-            
-        # types required for required tags
-        if not isinstance(self.metadata['localfile'], str):
-            raise TypeError("%s 'localfile' must be a string." % src_basename)
-        if not isinstance(self.metadata['format'], dict):
-            raise TypeError("%s 'format' must be an object." % src_basename)
-        if not isinstance(self.metadata['schema'], dict):
-            raise TypeError("%s 'schema' must be an object." % src_basename)
+            if not isinstance(value, tag_type):
+                raise TypeError("%s '%s' must be %s." % (src_basename, tag, type_name))
+
+        if 'schema_groups' not in metadata:
+            raise LookupError("%s 'schema_groups' tag is missing." % src_basename)
         
         # required schema groups as defined in the configuration file
-        db_types = tuple([group for group in self.config['labels']])
+        db_types = frozenset(self.config['labels'])
         
-        schema_groups = self.metadata['schema_groups']
+        schema_groups = metadata['schema_groups']
 
         if isinstance(schema_groups, str):
             if schema_groups not in db_types:
@@ -137,143 +187,147 @@ class Source(object):
             else:
                 schema_groups = [schema_groups] # turn schema_groups into a list
                 
-        elif isinstance(schema_groups, list):
-            for group in schema_groups:
-                if group not in db_types:
-                    raise ValueError(
-                        "%s schema group does not appear in '%s'" % (src_basename, schema_groups)
-                    )
+        elif _is_leaf(schema_groups): # list of strings
+            missing = set(schema_groups).difference(db_types)
+            if missing:
+                raise ValueError(
+                    "%s schema groups not in configuration: %s" % (src_basename, sorted(missing))
+                )
             
         else:
-            raise TypeError("%s 'schema_groups' must be a string or list." % src_basename)
+            raise TypeError("%s 'schema_groups' must be a string or list of strings." % src_basename)
 
         # required tags for 'format'
-        if 'type' not in self.metadata['format']:
+        file_format = metadata['format']
+        if 'type' not in file_format:
             raise LookupError("%s 'format.type' tag is missing." % src_basename)
-        if not isinstance(self.metadata['format']['type'], str):
+        if not isinstance(file_format['type'], str):
             raise TypeError("%s 'format.type' must be a string." % src_basename)
 
         # required formats
-        if (self.metadata['format']['type'] == 'csv'):
+        if (file_format['type'] == 'csv'):
             # -- CSV --
             # delimiter
-            if 'delimiter' not in self.metadata['format']:
+            if 'delimiter' not in file_format:
                 raise LookupError("%s 'format.delimiter' tag is missing for format 'csv'" % src_basename)
-            elif not (isinstance(self.metadata['format']['delimiter'], str) and
-                      len(self.metadata['format']['delimiter']) == 1):
+            elif not (isinstance(file_format['delimiter'], str) and
+                      len(file_format['delimiter']) == 1):
                 raise TypeError("%s 'format.delimiter' must be a single character string." % src_basename)
             
             # quotes
-            if 'quote' not in self.metadata['format']:
+            if 'quote' not in file_format:
                 raise LookupError("%s 'format.quote' tag is missing for format 'csv'" % src_basename)
-            elif not (isinstance(self.metadata['format']['quote'], str) and
-                      len(self.metadata['format']['quote']) == 1):
+            elif not (isinstance(file_format['quote'], str) and
+                      len(file_format['quote']) == 1):
                 raise TypeError("%s 'format.quote' must be a single character string." % src_basename)
             
-        elif (self.metadata['format']['type'] == 'xml'):
+        elif (file_format['type'] == 'xml'):
             # -- XML --
             # xml header
-            if 'header' not in self.metadata['format']:
+            if 'header' not in file_format:
                 raise LookupError("%s 'format.header' tag is missing for format 'xml'" % src_basename)
-            elif not isinstance(self.metadata['format']['header'], str):
+            elif not isinstance(file_format['header'], str):
                 raise TypeError("%s 'format.header' must be a string." % src_basename)
         else:
             # -- unsupported format --
-            raise ValueError("%s Unsupported data format '%s'" % (src_basename, self.metadata['format']['type']))
+            raise ValueError("%s Unsupported data format '%s'" % (src_basename, file_format['type']))
         
         #####################
         # OPTIONAL METADATA #
         #####################
 
         # dataset provider (name)
-        if 'provider' in self.metadata and (not isinstance(self.metadata['provider'], str)):
+        if 'provider' in metadata and (not isinstance(metadata['provider'], str)):
             raise TypeError("%s 'provider' must be a string." % src_basename)
 
         # -- filter contents check --
-        if 'filter' in self.metadata:
-            if not isinstance(self.metadata['filter'], dict):
+        if 'filter' in metadata:
+            filters = metadata['filter']
+            if not isinstance(filters, dict):
                 raise TypeError("%s 'filter' must be an object." % src_basename)
             else:
-                for attribute in self.metadata['filter']:
-                    if not isinstance(self.metadata['filter'][attribute], str):
+                for attribute in filters:
+                    attr_filter = filters[attribute]
+                    if isinstance(attr_filter, re.Pattern): # compiled by a previous parse()
+                        continue
+                    elif not isinstance(attr_filter, str):
                         raise TypeError(
                             "%s Filter attribute '%s' must be a string (regex)." % (src_basename, attribute)
                         )
                     else:
-                        attr_filter = self.metadata['filter'][attribute]
-                        regexp = re.compile(attr_filter)
-                        self.metadata['filter'][attribute] = regexp
+                        filters[attribute] = _compile_filter(attr_filter)
 
         ###################
         # PATH ASSIGNMENT #
         ###################
         
-        self.localfile = self.metadata['localfile']
+        self.localfile = metadata['localfile']
 
         if self.default_paths:
-            dirs = {
-                'input' : './data/input',
-                'output' : './data/output'
-            }
-            extensions = ('.csv', '.xml')
-            basename = os.path.splitext(self.localfile)
-
-            assert basename[1] in extensions, \
-                "%s 'localfile' has an invalid file extension '%s'" % (src_basename, basename[1])
-            
-            self.input_path = os.path.join(dirs['input'], self.localfile)
-            self.output_path = os.path.join(dirs['output'], basename[0] + '.csv')
+            name, ext = os.path.splitext(self.localfile)
 
-        # check entire source to make sure correct keys are being used
-        root_layer = ('localfile', 'format', 'schema_groups', 'encoding', 'schema',
-                      'filter', 'provider', 'licence', 'source')
-        format_layer = ('type', 'header', 'quote', 'delimiter')
-        
-        for i in self.metadata:
-            if i not in root_layer:
-                raise ValueError("%s Invalid key in root_layer '%s' in source file" % (src_basename, i))
+            assert ext in EXTENSIONS, \
+                "%s 'localfile' has an invalid file extension '%s'" % (src_basename, ext)
+            
+            self.input_path = os.path.join(INPUT_DIR, self.localfile)
+            self.output_path = os.path.join(OUTPUT_DIR, name + '.csv')
+
+        # check entire source to make sure correct keys are being used, the first
+        # invalid key (in file order) is reported
+        if not metadata.keys() <= ROOT_LAYER:
+            i = next(i for i in metadata if i not in ROOT_LAYER)
+            raise ValueError("%s Invalid key in root_layer '%s' in source file" % (src_basename, i))
             
-        for i in self.metadata['format']:
-            if i not in format_layer:
-                raise ValueError("%s Invalid key in format_layer '%s' in source file" % (src_basename, i))
+        if not file_format.keys() <= FORMAT_LAYER:
+            i = next(i for i in file_format if i not in FORMAT_LAYER)
+            raise ValueError("%s Invalid key in format_layer '%s' in source file" % (src_basename, i))
 
         #############################################
         # SCHEMA VALIDATION AND COLUMN NAME MAPPING #
         #############################################
         
         # check contents of 'schema' and build the column map (to be used for label map)
-        column_names = tuple()
+        column_names = list()
 
         for group in schema_groups:
-            group_labels = literal_eval(self.config.get('labels', group))
+            group_labels = parse_label(self.config.get('labels', group))
             if not isinstance(group_labels, tuple):
                 raise SyntaxError(
                     "%s Invalid config syntax for label in group %s" % (src_basename, group)
                 )
-            column_names += group_labels
-
-        self.column_map = dict()
-
-        def is_leaf(a):
-            if isinstance(a, str):
-                return True
-            elif isinstance(a, list):
-                for item in a:
-                    if not isinstance(item, str):
-                        return False
-                return True
-            else:
-                return False
-        
-        for k in self.metadata['schema']:
-            node = self.metadata['schema'][k]
+            column_names.extend(group_labels)
+
+        self.column_map = dict(self._walk_schema(src_basename, frozenset(column_names),
+                                                 frozenset(schema_groups)))
+
+        # set logger for source file
+        self.logger = logging.getLogger(self.localfile)
+
+    def _walk_schema(self, src_basename, column_names, schema_groups):
+        """
+        Validate the schema of the source file, generating its (column name, value)
+        pairs for the column map in order.
+
+        Args:
+            src_basename (str): Source file name, for error messages.
+            column_names (frozenset): Column names of the schema groups.
+            schema_groups (frozenset): Schema groups of the source file.
+
+        Raises:
+            TypeError: Incorrect JSON type for a schema entry.
+            ValueError: Invalid key in the schema.
+        """
+        schema = self.metadata['schema']
+
+        for k in schema:
+            node = schema[k]
             
-            if is_leaf(node):
+            if _is_leaf(node):
                 if k not in column_names:
                     raise ValueError("%s: Invalid key '%s', must be target column name(s) if value"
                                      " is a string or list of strings." % (src_basename, k))
 
-                self.column_map[k] = node
+                yield k, node
 
             elif isinstance(node, dict):
                 if k not in schema_groups:
@@ -283,7 +337,7 @@ class Source(object):
                 # otherwise check that children are keys to a column name
                 for c in node:
                     child = node[c]
-                    if not is_leaf(child):
+                    if not _is_leaf(child):
                         raise TypeError("%s: Value of key '%s' in group '%s' must be a string or list"
                                           " of strings." % (src_basename, c, k))
 
@@ -291,11 +345,8 @@ class Source(object):
                         raise ValueError("%s: Invalid key '%s' in group '%s', must be target column name(s)."
                                          % (src_basename, c, k))
 
-                    self.column_map[c] = child
+                    yield c, child
                     
             else:
                 raise TypeError("%s: Value of key '%s' must be a string, list of strings, or object."
                                   % (src_basename, k))
-            
-        # set logger for source file
-        self.logger = logging.getLogger(self.localfile)
@@ -12,25 +12,23 @@ Created and written by Maksym Neyra-Nesterenko, with support and funding from th
 *Center for Special Business Projects* (CSBP) at *Statistics Canada*.
 """
 
-import csv
-import logging
-import operator
-import os
-import re
-import subprocess
-import sys
-from xml.etree import ElementTree
-
 from opentabulate.main.source import Source
 from opentabulate.main.algorithm import *
 
+# Algorithm subclass used for each input data format
+FORMAT_ALGORITHMS = {'csv' : CSV_Algorithm,
+                     'xml' : XML_Algorithm}
+
 class DataProcess(object):
     """
     A data processing interface for a source file. 
     
     Attributes:
         source (Source): Dataset abstraction.
+        algorithm (Algorithm): Any (sub)class of Algorithm.
     """
+    __slots__ = ('source', 'algorithm')
+
     def __init__(self, source=None, algorithm=None):
         """
         Initialize a DataProcess object.
@@ -51,14 +49,19 @@ class DataProcess(object):
 
         Args:
             interrupt (threading.Event): Event to halt multi-threaded processing.
+
+        Raises:
+            ValueError: Unsupported data format.
         """
-        if self.source.metadata['format']['type'] == 'csv':
-            fmt_algorithm = CSV_Algorithm(self.source, interrupt)
-            if 'encoding' not in self.source.metadata:
-                csv_encoding = fmt_algorithm.char_encode_check()
-                self.source.metadata['encoding'] = csv_encoding # prevents redundant encoding checks
-        elif self.source.metadata['format']['type'] == 'xml':
-            fmt_algorithm = XML_Algorithm(self.source, interrupt)
+        data_format = self.source.metadata['format']['type']
+        if data_format not in FORMAT_ALGORITHMS:
+            raise ValueError("Unsupported data format '%s'" % data_format)
+
+        fmt_algorithm = FORMAT_ALGORITHMS[data_format](self.source, interrupt)
+
+        if data_format == 'csv' and 'encoding' not in self.source.metadata:
+            csv_encoding = fmt_algorithm.char_encode_check()
+            self.source.metadata['encoding'] = csv_encoding # prevents redundant encoding checks
             
         # initialize self.algorithm for other methods
         self.algorithm = fmt_algorithm
@@ -1,104 +1,190 @@
 # -*- coding: utf-8 -*-
 """
-A module for multithreading data processing in OpenTabulate.
+A module for parallel data processing in OpenTabulate.
 
 Created and written by Maksym Neyra-Nesterenko, with support and funding from the
 Center for Special Business Projects (CSBP) at Statistics Canada.
 """
 import logging
-import os
 import signal
-from copy import deepcopy
-from threading import Thread, Event
-from queue import Queue, Empty
+import threading
+import traceback
+from array import array
 
+from opentabulate.main.args import LOG_FORMAT
 from opentabulate.main.main_funcs import process
-from opentabulate.main.thread_exception import ThreadInterruptError
+
+# number of chunks of sources per worker process, smaller chunks balance the load
+# between workers better, larger ones have less communication overhead
+CHUNKS_PER_WORKER = 4
+
+# return code stored for sources that were not processed (None in 'get_rcodes')
+RCODE_NONE = -1
+
+# interrupt event, tasks and fail fast flag of a worker process, set by '_init_worker'
+_worker_interrupt = None
+_worker_tasks = None
+_worker_fail_fast = False
+
+def _process_sources(sources, interrupt, fail_fast=False):
+    """
+    Process a list of sources in order, until an interrupt occurs.
+
+    Args:
+        sources (list): Source objects to process.
+        interrupt (threading.Event): Event to halt processing.
+        fail_fast (bool): Set the interrupt event if a source fails.
+
+    Returns:
+        list: Return codes of 'process' for each source, 1 for sources that failed
+            with an unhandled error and None for sources that were not processed
+            due to an interrupt.
+    """
+    rcodes = list()
+
+    for source in sources:
+        rcode = None
+        if not interrupt.is_set():
+            try:
+                rcode = process(source, interrupt)
+            except Exception:
+                logging.error("Failed to process '%s':\n%s"
+                              % (source.localfile, traceback.format_exc()))
+                rcode = 1
+            if fail_fast and rcode != 0:
+                interrupt.set()
+        rcodes.append(rcode)
+
+    return rcodes
+
+def _init_worker(interrupt, log_level, tasks, fail_fast):
+    """
+    Worker process initializer. Interrupt signals are handled by the main process,
+    which sets the shared interrupt event instead. The Source objects to process
+    are passed once per worker (and are not pickled at all if worker processes
+    are forked), tasks then only refer to them by index.
+    """
+    global _worker_interrupt, _worker_tasks, _worker_fail_fast
+    _worker_interrupt = interrupt
+    _worker_tasks = tasks
+    _worker_fail_fast = fail_fast
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # logging is not inherited if worker processes are spawned
+    if not logging.getLogger().handlers:
+        logging.basicConfig(format=LOG_FORMAT, level=log_level)
+
+def _process_chunk(start, stop):
+    """Worker process function, processes the tasks with indices in [start, stop)."""
+    return _process_sources(_worker_tasks[start:stop], _worker_interrupt, _worker_fail_fast)
+
 
 class ThreadPool():
     """
-    A custom thread pool class. The pool creates a fixed number (specified by the 
-    user) of worker threads, each of which process data tasks independently from a 
-    queue.
+    A custom worker pool class. The pool processes data tasks on a fixed number
+    (specified by the user) of worker processes, so that CPU bound tasks are not
+    serialized by the global interpreter lock. With a single worker, the tasks are
+    processed in the current process.
 
     The pool has __enter__ and __exit__ methods so it can be loaded into its own
     context (e.g. used in a 'with' statement).
 
     Attributes:
-        workers (list): a list of threading.Thread objects, i.e. consisting of
-            worker threads.
-        rcodes (list): return codes for each data task completed by a thread.
-        task_queue (queue.Queue): a thread-safe queue accessible by each worker
-            thread.
-        interrupt (threading.Event): an interrupt event used to cleanly terminate
-            the worker threads.
+        tasks (list): a list of Source objects to process.
+        num_threads (int): number of worker processes.
+        fail_fast (bool): stop processing once a task fails.
+        rcodes (array.array): return codes for each data task completed by a worker,
+            stored compactly with RCODE_NONE in place of None. Tasks that failed
+            have return code 1, tasks not processed due to an interrupt None.
+        interrupt (threading.Event or multiprocessing.Event): an interrupt event used
+            to cleanly terminate the workers, shared with worker processes if used.
     """
-    def __init__(self, tasks, num_threads=1):
+    __slots__ = ('tasks', 'num_threads', 'fail_fast', 'rcodes', 'interrupt')
+
+    def __init__(self, tasks, num_threads=1, fail_fast=False):
         """
-        Initialize thread pool by loading task queue and worker threads.
+        Initialize worker pool with its tasks.
 
         Args:
             tasks (list): list of Source objects
-            num_threads (int): number of worker threads to initialize
+            num_threads (int): number of worker processes to use
+            fail_fast (bool): stop processing once a task fails
 
         Raises:
-            AssertionError: number of worker threads specified must be > 0.
+            AssertionError: number of worker processes specified must be > 0.
         """
-        self.workers = list()
-        self.rcodes = [None] * len(tasks)
-        self.task_queue = Queue()
-        self.interrupt = Event()
-
         assert (num_threads > 0), "Number of threads must be > 0"
-        
-        for _ in range(num_threads):
-            self.workers.append(Thread(target=self._process_jobs))
 
-        for j in range(len(tasks)):
-            self.task_queue.put((tasks[j], j)) # (Source, idx)
+        self.tasks = list(tasks)
+        self.num_threads = num_threads
+        self.fail_fast = fail_fast
+        self.rcodes = array('b', [RCODE_NONE]) * len(self.tasks)
 
-    def execute_threads(self):
-        """Execute tasks on worker threads until queue is empty."""
-        for w in self.workers:
-            w.start()
-        
-        self.task_queue.join()
+        if self._use_processes():
+            # only imported if worker processes are used
+            import multiprocessing
+            self.interrupt = multiprocessing.Event()
+        else:
+            self.interrupt = threading.Event()
 
-        for w in self.workers:
-            w.join()
+    def execute_threads(self):
+        """Execute tasks on the workers until all are completed or interrupted."""
+        if not self._use_processes():
+            self._set_rcodes(0, _process_sources(self.tasks, self.interrupt,
+                                                 self.fail_fast))
+            return
+
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        num_workers = min(self.num_threads, len(self.tasks))
+        chunksize = max(1, len(self.tasks) // (num_workers * CHUNKS_PER_WORKER))
+
+        with ProcessPoolExecutor(max_workers=num_workers,
+                                 initializer=_init_worker,
+                                 initargs=(self.interrupt, logging.getLogger().level,
+                                           self.tasks, self.fail_fast)
+        ) as executor:
+            futures = dict()
+            for start in range(0, len(self.tasks), chunksize):
+                stop = min(start + chunksize, len(self.tasks))
+                futures[executor.submit(_process_chunk, start, stop)] = start
+
+            for future in as_completed(futures):
+                start = futures[future]
+                try:
+                    rcodes = future.result()
+                except Exception: # e.g. a worker process was terminated
+                    logging.error("Failed to process a chunk of sources:\n%s"
+                                  % traceback.format_exc())
+                    rcodes = [1] * (min(start + chunksize, len(self.tasks)) - start)
+                self._set_rcodes(start, rcodes)
+
+    def _use_processes(self):
+        """Tasks are processed on worker processes only if there is more than one."""
+        return self.num_threads > 1 and len(self.tasks) > 1
 
     def get_rcodes(self):
         """
-        Obtain return codes from tasks completed by worker threads. The order
-        of the return codes is preserved and matches that of the input argument 
+        Obtain return codes from tasks completed by the workers. The order
+        of the return codes is preserved and matches that of the input argument
         'tasks' in self.__init__(.).
         """
-        return deepcopy(self.rcodes)
+        return [None if rcode == RCODE_NONE else rcode for rcode in self.rcodes]
+
+    def _set_rcodes(self, start, rcodes):
+        """Store the return codes of consecutive tasks, beginning at index 'start'."""
+        self.rcodes[start:start + len(rcodes)] = \
+            array('b', [RCODE_NONE if rcode is None else rcode for rcode in rcodes])
 
     def _signal_handler(self, signum, frame):
         """If interrupt signal is heard, set interrupt flag."""
         self.interrupt.set()
         logging.error('Interrupt signal %s caught' % signum)
 
-    def _process_jobs(self):
-        """Worker thread function."""
-        while True:
-            source, idx, rcode = None, None, None
-            try:
-                source, idx = self.task_queue.get(block=False)
-                if not self.interrupt.is_set():
-                    rcode = process(source, self.interrupt)
-                else:
-                    rcode = None
-            except Empty:
-                break
-            
-            self.rcodes[idx] = rcode
-            self.task_queue.task_done()
-
     def __enter__(self):
         signal.signal(signal.SIGINT, self._signal_handler)
         return self
 
     def __exit__(self, exc_type, exc_value, tb):
-        signal.signal(signal.SIGINT, signal.default_int_handler)
\ No newline at end of file
+        signal.signal(signal.SIGINT, signal.default_int_handler)
@@ -8,12 +8,14 @@ Created and written by Maksym Neyra-Nesterenko, with support and funding from th
 
 import re
 import os
+import tempfile
 import unittest
 from xml.etree.ElementTree import Element as xmlElement
 
 from opentabulate.main.source import Source
 from opentabulate.main.config import Configuration
-from opentabulate.main.algorithm import Algorithm, CSV_Algorithm, XML_Algorithm
+from opentabulate.main import algorithm
+from opentabulate.main.algorithm import Algorithm, CSV_Algorithm, XML_Algorithm, ElementTree
 
 
 def cmp_output_bytes(path1, path2):
@@ -80,6 +82,34 @@ class TestAlgorithm(unittest.TestCase):
             cmp_output_bytes(self.csv_target_output, self.csv_test_output)
         )
       
+    def test_parallel_process_csv(self):
+        """
+        OpenTabulate CSV tabulation test using multiple worker processes.
+        """
+        config = Configuration(self.config_file)
+        config.load()
+        config.validate()
+        config.set('general', 'tabulate_workers', '2')
+
+        source = Source(self.csv_src_input, config=config, default_paths=False)
+        source.parse()
+
+        source.input_path = self.csv_test_input
+        source.output_path = self.csv_test_output
+
+        batch_size = algorithm.TABULATE_BATCH_SIZE
+        algorithm.TABULATE_BATCH_SIZE = 1 # split input over several batches
+        try:
+            csv_alg = CSV_Algorithm(source)
+            csv_alg.construct_label_map()
+            csv_alg.tabulate()
+        finally:
+            algorithm.TABULATE_BATCH_SIZE = batch_size
+
+        self.assertTrue(
+            cmp_output_bytes(self.csv_target_output, self.csv_test_output)
+        )
+
     def test_basic_process_xml(self):
         """
         OpenTabulate XML parsing and tabulation test.
@@ -102,6 +132,43 @@ class TestAlgorithm(unittest.TestCase):
             cmp_output_bytes(self.xml_target_output, self.xml_test_output)
         )
         
+    def test_char_encode_check(self):
+        """
+        Test for Algorithm.char_encode_check method.
+
+        The input data is decoded in blocks, so multibyte characters may be split
+        between blocks.
+        """
+        config = Configuration(self.config_file)
+        config.load()
+        config.validate()
+
+        source = Source(self.csv_src_input, config=config, default_paths=False)
+        source.parse()
+        del source.metadata['encoding']
+
+        block_size = algorithm.ENCODING_CHECK_BLOCK_SIZE
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source.input_path = tmp_dir + '/data.csv'
+            csv_alg = CSV_Algorithm(source)
+            try:
+                for algorithm.ENCODING_CHECK_BLOCK_SIZE in (block_size, 1, 2):
+                    for contents, enc in (('name\n\u00e9\u20ac\n', 'utf-8'),
+                                          ('name\n\u00e9\u20ac\n', 'cp1252'),
+                                          ('name\n', 'cp1252')):
+                        with open(source.input_path, 'w', encoding=enc) as f:
+                            f.write(contents)
+                        expected = 'utf-8' if contents.isascii() else enc
+                        self.assertEqual(csv_alg.char_encode_check(), expected)
+
+                    # truncated multibyte character, not valid UTF-8 nor cp1252
+                    with open(source.input_path, 'wb') as f:
+                        f.write(b'name\n\x81\xe2\x82')
+                    with self.assertRaises(RuntimeError):
+                        csv_alg.char_encode_check()
+            finally:
+                algorithm.ENCODING_CHECK_BLOCK_SIZE = block_size
+
     def test__is_row_empty(self):
         """
         Test for Algorithm._isRowEmpty method.
@@ -141,6 +208,35 @@ class TestAlgorithm(unittest.TestCase):
 
         self.a.LOWERCASE = None
 
+    def test__csv_compile_transform(self):
+        """
+        Test for CSV_Algorithm._csv_compile_transform method.
+
+        The compiled transform must agree with the plan entries cleaned by
+        '_quickCleanEntry', including joins of no entries.
+        """
+        csv_alg = CSV_Algorithm()
+        csv_alg._csv_plan = [
+            ('copy', 1),
+            ('force', 'Forced'),
+            ('join', [('copy', 0), ('force', ' B '), ('copy', 2)]),
+            ('join', [('copy', 2)]),
+            ('join', []),
+        ]
+        entity = [' A\t', 'x  Y ', '\nC']
+
+        for no_whitespace, lowercase in ((None, None), (True, None), (None, True), (True, True)):
+            csv_alg.NO_WHITESPACE = no_whitespace
+            csv_alg.LOWERCASE = lowercase
+            clean = csv_alg._quickCleanEntry
+            self.assertEqual(csv_alg._csv_compile_transform()(entity), [
+                clean('x  Y '),
+                'Forced',
+                clean(' A\t  B  \nC'),
+                clean('\nC'),
+                '',
+            ])
+
     def test__is_force_value(self):
         """
         Test for Algorithm._isForceValue method.
@@ -171,6 +267,42 @@ class TestAlgorithm(unittest.TestCase):
 
         self.assertEqual(self.xa._xml_is_element_missing(element, None, None), text)
         
+    def test__xml_lookup(self):
+        """
+        Test for XML_Algorithm._xml_lookup and XML_Algorithm._xml_find methods.
+
+        Plain tag names are looked up by iterating over descendants, otherwise the
+        tag is evaluated as an ElementPath expression relative to the header, with
+        either XML backend.
+        """
+        config = Configuration(self.config_file)
+        config.load()
+        config.validate()
+
+        source = Source(self.xml_src_input, config=config, default_paths=False)
+        source.parse()
+        xml_alg = XML_Algorithm(source)
+
+        self.assertEqual(xml_alg._xml_lookup('name'), ('tag', 'name'))
+        self.assertEqual(xml_alg._xml_lookup('{urn:a}name'), ('tag', '{urn:a}name'))
+        self.assertIn(xml_alg._xml_lookup('a/name')[0], ('path', 'xpath'))
+        self.assertIn(xml_alg._xml_lookup('Item')[0], ('path', 'xpath'))
+
+        head = ElementTree.Element('Item')
+        child = ElementTree.SubElement(head, 'a')
+        name = ElementTree.SubElement(child, 'name')
+
+        self.assertIs(xml_alg._xml_find(head, xml_alg._xml_lookup('name')), name)
+        self.assertIs(xml_alg._xml_find(head, xml_alg._xml_lookup('a/name')), name)
+        self.assertIsNone(xml_alg._xml_find(head, xml_alg._xml_lookup('Item')))
+
+        # XPath only syntax is rejected regardless of the backend
+        for tag in ('.', '..', './name', '../name', '..//name'):
+            with self.assertRaises(SyntaxError):
+                xml_alg._xml_lookup(tag)
+
+        self.assertIs(xml_alg._xml_find(head, xml_alg._xml_lookup('name/..')), child)
+
     @classmethod
     def tearDownClass(cls):
         pass
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the data processing cache (cache.py) of OpenTabulate.
+
+Created and written by Maksym Neyra-Nesterenko, with support and funding from the
+*Center for Special Business Projects* (CSBP) at *Statistics Canada*.
+"""
+
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from opentabulate.main import cache
+from opentabulate.main.cache import CacheManager
+
+class FakeBlake3():
+    """
+    Stand-in for the blake3 hash class, computing SHA256 digests so that digests
+    of either backend only differ by their prefix.
+    """
+    AUTO = -1
+
+    def __init__(self, data=b'', max_threads=1):
+        self.max_threads = max_threads
+        self._hash = hashlib.sha256(data)
+
+    def update(self, data):
+        self._hash.update(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+class TestCacheManager(unittest.TestCase):
+    """
+    Cache manager unit tests, with the cache file in a temporary directory.
+    """
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+        self.cache_path = os.path.join(self.tmpdir, 'cache', 'hashes.txt')
+
+    def write_data(self, name, contents):
+        """Write a data file in the temporary directory, returning its path."""
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as data:
+            data.write(contents)
+        return path
+
+    def test_read_cache(self):
+        """
+        Test for CacheManager.read_cache method, with lines with and without
+        (size, modification time) stamps.
+        """
+        cache_mgr = CacheManager(self.cache_path)
+        self.assertTrue(os.path.isfile(self.cache_path))
+
+        with open(self.cache_path, 'w') as cache_file:
+            cache_file.write("old.csv 0123abcd\n"
+                             "new data.csv 4567ef 12 1600000000000000000\n")
+        cache_mgr.read_cache()
+
+        self.assertEqual(cache_mgr.query('old.csv'), '0123abcd')
+        self.assertNotIn('old.csv', cache_mgr.stamps)
+        self.assertEqual(cache_mgr.query('new data.csv'), '4567ef')
+        self.assertEqual(cache_mgr.stamps['new data.csv'], (12, 1600000000000000000))
+        self.assertIsNone(cache_mgr.query('missing.csv'))
+
+        with open(self.cache_path, 'w') as cache_file:
+            cache_file.write("malformed.csv\n")
+        with self.assertRaises(IOError):
+            cache_mgr.read_cache()
+
+    def test_write_cache(self):
+        """
+        Test that written caches are read back unchanged, including filenames with
+        spaces and entries without stamps.
+        """
+        entries = {'a.csv' : ('ab01', (3, 1600000000000000000)),
+                   'name with spaces.csv' : ('cd23', (0, 1)),
+                   'no stamp.xml' : ('blake3:ef45', None),
+                   ' leading space.csv' : ('6789', None)}
+
+        cache_mgr = CacheManager(self.cache_path)
+        for filename, (digest, stamp) in entries.items():
+            cache_mgr.insert(filename, digest, stamp)
+        # replaced entries drop their previous stamp
+        cache_mgr.insert('no stamp.xml', 'blake3:ef45')
+        cache_mgr.write_cache()
+        self.assertFalse(os.path.exists(self.cache_path + '.tmp'))
+
+        read_mgr = CacheManager(self.cache_path)
+        read_mgr.read_cache()
+        self.assertEqual(read_mgr.cache, cache_mgr.cache)
+        self.assertEqual(read_mgr.stamps, cache_mgr.stamps)
+        self.assertEqual(read_mgr.stamps, {filename : stamp for filename, (_, stamp)
+                                           in entries.items() if stamp is not None})
+
+        read_mgr.flush()
+        self.assertEqual((read_mgr.cache, read_mgr.stamps), (dict(), dict()))
+
+    def test_hash_file(self):
+        """
+        Test that CacheManager.hash_file only returns the cached digest if the stamp
+        of the data is unchanged, and hashes the data otherwise.
+        """
+        path = self.write_data('data file.csv', "a,b\n1,2\n")
+        if cache.BLAKE3_HASH:
+            expected = cache.BLAKE3_PREFIX + cache.blake3(b"a,b\n1,2\n").hexdigest()
+        else:
+            expected = hashlib.sha256(b"a,b\n1,2\n").hexdigest()
+
+        cache_mgr = CacheManager(self.cache_path)
+        self.assertEqual(cache_mgr.compute_hash(path), expected)
+
+        # not cached
+        digest, stamp = cache_mgr.hash_file('data file.csv', path)
+        stat = os.stat(path)
+        self.assertEqual((digest, stamp), (expected, (stat.st_size, stat.st_mtime_ns)))
+        self.assertEqual(cache.file_stamp(path), stamp)
+
+        # cached with the same stamp, the data is not hashed again
+        cache_mgr.insert('data file.csv', 'cached', stamp)
+        self.assertEqual(cache_mgr.hash_file('data file.csv', path), ('cached', stamp))
+
+        # cached without a stamp (old cache format) or with another stamp
+        cache_mgr.insert('data file.csv', 'cached')
+        self.assertEqual(cache_mgr.hash_file('data file.csv', path), (expected, stamp))
+
+        size, mtime = stamp
+        cache_mgr.insert('data file.csv', 'cached', (size, mtime + 1))
+        self.assertEqual(cache_mgr.hash_file('data file.csv', path), (expected, stamp))
+
+        # stamp mismatch after a round trip through the cache file
+        cache_mgr.insert('data file.csv', 'cached', (size + 1, mtime))
+        cache_mgr.write_cache()
+        read_mgr = CacheManager(self.cache_path)
+        read_mgr.read_cache()
+        self.assertEqual(read_mgr.hash_file('data file.csv', path), (expected, stamp))
+
+    def test_compute_hash_backends(self):
+        """
+        Test that BLAKE3 digests are prefixed, so that cached digests of one hash
+        backend never match those of the other.
+        """
+        path = self.write_data('data.csv', "a,b\n1,2\n")
+        sha256_digest = hashlib.sha256(b"a,b\n1,2\n").hexdigest()
+
+        blake3_mgr = CacheManager(self.cache_path)
+        with mock.patch.multiple(cache, BLAKE3_HASH=True, blake3=FakeBlake3, create=True):
+            blake3_digest = blake3_mgr.compute_hash(path)
+            self.assertEqual(blake3_digest, cache.BLAKE3_PREFIX + sha256_digest)
+
+            digest, stamp = blake3_mgr.hash_file('data.csv', path)
+            self.assertEqual(digest, blake3_digest)
+            size, mtime = stamp
+            blake3_mgr.insert('data.csv', digest, (size, mtime + 1))
+            blake3_mgr.write_cache()
+
+        # the fallback backend rehashes the data since the stamp differs, its
+        # digest differs from the cached BLAKE3 digest
+        with mock.patch.object(cache, 'BLAKE3_HASH', False):
+            sha256_mgr = CacheManager(self.cache_path)
+            sha256_mgr.read_cache()
+            self.assertEqual(sha256_mgr.query('data.csv'), blake3_digest)
+
+            digest, _ = sha256_mgr.hash_file('data.csv', path)
+            self.assertEqual(digest, sha256_digest)
+            self.assertNotEqual(digest, sha256_mgr.query('data.csv'))
+
+            sha256_mgr.insert('data.csv', digest, (size, mtime + 1))
+            sha256_mgr.write_cache()
+
+        # and the other way around
+        with mock.patch.multiple(cache, BLAKE3_HASH=True, blake3=FakeBlake3, create=True):
+            blake3_mgr = CacheManager(self.cache_path)
+            blake3_mgr.read_cache()
+            self.assertEqual(blake3_mgr.query('data.csv'), sha256_digest)
+
+            digest, _ = blake3_mgr.hash_file('data.csv', path)
+            self.assertEqual(digest, blake3_digest)
+            self.assertNotEqual(digest, blake3_mgr.query('data.csv'))
+
+    @unittest.skipUnless(cache.BLAKE3_HASH, "blake3 package is not installed")
+    def test_compute_hash_blake3(self):
+        """
+        Test for CacheManager.compute_hash with the blake3 package.
+        """
+        path = self.write_data('data.csv', "a,b\n1,2\n" * 100000)
+        digest = CacheManager(self.cache_path).compute_hash(path)
+        self.assertEqual(digest, cache.BLAKE3_PREFIX
+                         + cache.blake3(b"a,b\n1,2\n" * 100000).hexdigest())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the configuration file parser (config.py) of OpenTabulate.
+
+Created and written by Maksym Neyra-Nesterenko, with support and funding from the
+*Center for Special Business Projects* (CSBP) at *Statistics Canada*.
+"""
+
+import unittest
+from ast import literal_eval
+
+from opentabulate.main import config
+from opentabulate.main.config import parse_label
+
+
+class TestConfig(unittest.TestCase):
+    """
+    Configuration unit tests.
+    """
+    def test_parse_label(self):
+        """
+        Test for parse_label function.
+
+        Results (or raised exceptions) must agree with ast.literal_eval, whether
+        or not the value takes the regular expression fast path.
+        """
+        values = [
+            # plain tags
+            "('a',)", "('a', 'b')", '("a", "b")', "( 'a' ,'b' , )", "('name', \"street no\")",
+            "('',)", "('a')", "()",
+            # list labels and other literals
+            "['a', 'b']", "('a', ['b'])", "('a', 1)", "1",
+            # quoted strings with commas or escapes
+            "('a, b', 'c')", "('a\\'b', 'c')", "('a\\nb',)", "(\"it's\", 'x')", "('a\\\\',)",
+            "('a' 'b',)", "(r'a\\b',)", "('a\"', \"b'\")",
+            # bad input
+            "('a', b)", "('a'", "a, b", "", "('a',) ('b',)",
+        ]
+
+        for value in values:
+            config._LABEL_CACHE.clear()
+            try:
+                expected = literal_eval(value)
+            except (ValueError, SyntaxError) as err:
+                with self.assertRaises(type(err)):
+                    parse_label(value)
+                continue
+
+            self.assertEqual(parse_label(value), expected)
+            self.assertIs(type(parse_label(value)), type(expected))
+            # cached result
+            self.assertEqual(parse_label(value), expected)
+
+if __name__ == '__main__':
+    unittest.main()
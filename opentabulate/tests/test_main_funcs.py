@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the command line script wrapper functions (main_funcs.py) of
+OpenTabulate.
+
+Created and written by Maksym Neyra-Nesterenko, with support and funding from the
+*Center for Special Business Projects* (CSBP) at *Statistics Canada*.
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+
+from opentabulate.main.source import Source
+from opentabulate.main.config import Configuration
+from opentabulate.main.main_funcs import process
+
+
+class TestMainFuncs(unittest.TestCase):
+    """
+    Data processing pipeline unit tests.
+    """
+    def setUp(self):
+        data_path = os.path.join(os.path.dirname(__file__), 'data')
+
+        config = Configuration(data_path + "/opentabulate.conf")
+        config.load()
+        config.validate()
+
+        self.source = Source(data_path + "/xml-source.json", config=config,
+                             default_paths=False)
+        self.source.parse()
+        self.source.input_path = data_path + "/xml-data.xml"
+
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.source.output_path = os.path.join(tmpdir.name, 'xml-output.csv')
+
+    def test_process(self):
+        """
+        Test for process function return codes.
+        """
+        self.assertEqual(process(self.source, threading.Event()), 0)
+        self.assertTrue(os.path.isfile(self.source.output_path))
+
+    def test_process_invalid_lookup(self):
+        """
+        Test that an invalid XML lookup fails the source, rather than raising.
+        """
+        self.source.column_map['i'] = '..'
+
+        with self.assertLogs(self.source.logger, level='ERROR'):
+            self.assertEqual(process(self.source, threading.Event()), 1)
+
+if __name__ == '__main__':
+    unittest.main()
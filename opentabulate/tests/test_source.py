@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the source file parser (source.py) of OpenTabulate.
+
+Created and written by Maksym Neyra-Nesterenko, with support and funding from the
+*Center for Special Business Projects* (CSBP) at *Statistics Canada*.
+"""
+
+import json
+import math
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from opentabulate.main import source
+from opentabulate.main.source import Source
+
+
+def strict_loads(data):
+    """
+    Stand-in for orjson.loads, rejecting (like orjson) input that is not UTF-8,
+    NaN and integers over 64 bits.
+    """
+    def reject(value):
+        raise json.JSONDecodeError("Unsupported value %s" % value, '', 0)
+
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        reject('encoding')
+
+    def parse_int(value):
+        if not -2 ** 63 <= int(value) < 2 ** 64:
+            reject(value)
+        return int(value)
+
+    return json.loads(text, parse_int=parse_int, parse_constant=reject)
+
+
+class TestSource(unittest.TestCase):
+    """
+    Source class unit tests.
+    """
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.src_path = os.path.join(tmpdir.name, 'source.json')
+
+    def read_metadata(self, contents, encoding='utf-8'):
+        """Write a source file and return the metadata read by a Source object."""
+        with open(self.src_path, 'w', encoding=encoding) as src_file:
+            src_file.write(contents)
+        return Source(self.src_path).metadata
+
+    def test_read_metadata(self):
+        """
+        Test that source files are read as by json.loads, with either backend.
+        """
+        contents = ('{"localfile": "d\\u00e9.csv", "format": {"type": "csv"}}',
+                    '{"localfile": "data.csv", "id": 18446744073709551616}',
+                    '{"localfile": "data.csv", "scale": 1.5e3}')
+        encodings = ('utf-8', 'utf-16', 'utf-32', 'utf-16-le')
+
+        for backend in (False, True):
+            with mock.patch.multiple(source, ORJSON_BACKEND=backend, create=True,
+                                     orjson=SimpleNamespace(loads=strict_loads,
+                                                            JSONDecodeError=json.JSONDecodeError)):
+                for text in contents:
+                    for encoding in encodings:
+                        self.assertEqual(self.read_metadata(text, encoding), json.loads(text))
+
+                metadata = self.read_metadata('{"localfile": "data.csv", "scale": NaN}')
+                self.assertTrue(math.isnan(metadata['scale']))
+
+                with self.assertRaises(json.JSONDecodeError):
+                    self.read_metadata('{"localfile": "data.csv",}')
+
+if __name__ == '__main__':
+    unittest.main()
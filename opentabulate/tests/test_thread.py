@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for parallel data processing (thread.py) of OpenTabulate.
+
+Created and written by Maksym Neyra-Nesterenko, with support and funding from the
+*Center for Special Business Projects* (CSBP) at *Statistics Canada*.
+"""
+
+import multiprocessing
+import os
+import unittest
+from collections import namedtuple
+from unittest import mock
+
+from opentabulate.main import thread
+from opentabulate.main.thread import ThreadPool, RCODE_NONE
+
+# stand-in for Source objects, processed by 'fake_process'
+FakeSource = namedtuple('FakeSource', ('localfile', 'rcode', 'set_interrupt'))
+
+def fake_process(source, interrupt):
+    """
+    Stand-in for main_funcs.process. The return code of the source is returned
+    after setting the interrupt event if requested, a return code of 'error'
+    raises an exception and one of 'exit' terminates the (worker) process.
+    """
+    if source.set_interrupt:
+        interrupt.set()
+    if source.rcode == 'error':
+        raise RuntimeError("Task failed.")
+    if source.rcode == 'exit':
+        os._exit(1)
+    return source.rcode
+
+def fake_sources(*tasks):
+    """Create FakeSource objects from (rcode, set_interrupt) pairs."""
+    return [FakeSource('data%d.csv' % i, rcode, set_interrupt)
+            for i, (rcode, set_interrupt) in enumerate(tasks)]
+
+
+class TestThreadPool(unittest.TestCase):
+    """
+    ThreadPool unit tests, with Source objects replaced by FakeSource objects.
+    """
+    def setUp(self):
+        patcher = mock.patch.object(thread, 'process', fake_process)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rcodes(self):
+        """
+        Test for ThreadPool._set_rcodes and ThreadPool.get_rcodes methods.
+        """
+        pool = ThreadPool([None] * 5)
+        self.assertEqual(pool.get_rcodes(), [None] * 5)
+
+        pool._set_rcodes(1, [0, 1, None])
+        self.assertEqual(list(pool.rcodes), [RCODE_NONE, 0, 1, RCODE_NONE, RCODE_NONE])
+        self.assertEqual(pool.get_rcodes(), [None, 0, 1, None, None])
+
+    def test_single_worker(self):
+        """
+        Test that tasks are processed in the current process with a single worker,
+        and that failed tasks (return code 1) do not stop processing unless
+        'fail_fast' is set.
+        """
+        pids = []
+        def process_in_pid(task, interrupt):
+            pids.append(os.getpid())
+            return fake_process(task, interrupt)
+
+        tasks = fake_sources((0, False), (1, False), ('error', False), (0, False))
+
+        with mock.patch.object(thread, 'process', process_in_pid), \
+             self.assertLogs(level='ERROR'):
+            pool = ThreadPool(tasks, num_threads=1)
+            pool.execute_threads()
+
+        self.assertEqual(pool.get_rcodes(), [0, 1, 1, 0])
+        self.assertEqual(pids, [os.getpid()] * len(tasks))
+
+        pool = ThreadPool(tasks, num_threads=1, fail_fast=True)
+        pool.execute_threads()
+        self.assertEqual(pool.get_rcodes(), [0, 1, None, None])
+
+        pool = ThreadPool(fake_sources((0, False), ('error', False), (0, False)),
+                          num_threads=1, fail_fast=True)
+        with self.assertLogs(level='ERROR'):
+            pool.execute_threads()
+        self.assertEqual(pool.get_rcodes(), [0, 1, None])
+
+    def test_single_worker_interrupt(self):
+        """
+        Test that tasks after an interrupt are left as RCODE_NONE.
+        """
+        pool = ThreadPool(fake_sources((0, False), (0, True), (0, False), (1, False)),
+                          num_threads=1)
+        pool.execute_threads()
+
+        self.assertEqual(list(pool.rcodes), [0, 0, RCODE_NONE, RCODE_NONE])
+        self.assertEqual(pool.get_rcodes(), [0, 0, None, None])
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == 'fork',
+                         "worker processes must inherit the patched 'process'")
+    def test_worker_processes(self):
+        """
+        Test return codes of tasks processed on several worker processes, in chunks.
+        """
+        tasks = fake_sources(*[(i % 2, False) for i in range(4 * 2 * thread.CHUNKS_PER_WORKER + 3)])
+
+        pool = ThreadPool(tasks, num_threads=2)
+        pool.execute_threads()
+        self.assertEqual(pool.get_rcodes(), [source.rcode for source in tasks])
+
+        # interrupted before processing, no task has a return code
+        pool = ThreadPool(tasks, num_threads=2)
+        pool.interrupt.set()
+        pool.execute_threads()
+        self.assertEqual(list(pool.rcodes), [RCODE_NONE] * len(tasks))
+        self.assertEqual(pool.get_rcodes(), [None] * len(tasks))
+
+        # failed tasks, and tasks of worker processes that were terminated
+        tasks = fake_sources((0, False), ('error', False), (0, False), (0, False))
+        pool = ThreadPool(tasks, num_threads=2)
+        # errors are logged by the worker processes
+        with mock.patch.object(thread.logging, 'error'):
+            pool.execute_threads()
+        self.assertEqual(pool.get_rcodes(), [0, 1, 0, 0])
+
+        # the other chunk may complete before the pool breaks
+        pool = ThreadPool(fake_sources(('exit', False), (0, False)), num_threads=2)
+        with self.assertLogs(level='ERROR'):
+            pool.execute_threads()
+        rcodes = pool.get_rcodes()
+        self.assertEqual(rcodes[0], 1)
+        self.assertIn(rcodes[1], (0, 1))
+
+if __name__ == '__main__':
+    unittest.main()
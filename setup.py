@@ -27,8 +27,6 @@ setup(
         'Topic :: Utilities',
         'Operating System :: POSIX :: Linux',
         'Environment :: Console',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8'
     ],
@@ -38,7 +36,12 @@ setup(
         'Bug tracker': 'https://github.com/CSBP-CPSE/OpenTabulate/issues',
         'License': 'https://github.com/CSBP-CPSE/OpenTabulate/tree/master/LICENSE.md'
     },
-    python_requires='>=3.5',
+    python_requires='>=3.7',
+    extras_require={
+        'lxml': ['lxml'],
+        'blake3': ['blake3'],
+        'orjson': ['orjson']
+    },
     test_suite='opentabulate.tests',
     packages=find_packages(exclude=['tests']),
     include_package_data=True,